@@ -1,5 +1,47 @@
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas
 
+from .Emon import EMONDataError
+from .compression import get_compression, open_file
+from .disk_cache import save_npz
+from .emon_metrics import group_counters
+from .line_index import LineOffsetIndex
+
+SAMPLE_SEPARATOR = b"----------"
+
+
+def counter_delta(values, bits=48, cumulative=False):
+    """
+    Counts per sample of fixed width counters, wrapped around at 2^bits
+
+    :param values: ndarray [samples, ...] int64
+    :param bits: int counter width
+    :param cumulative: bool, True when values are running counter readings
+    :return: ndarray int64, one sample less for cumulative values
+    """
+    if cumulative:
+        values = np.diff(values, axis=0)
+    # a wrapped counter gives a negative delta, two's complement masking
+    # turns it into the count modulo 2^bits
+    return values & np.int64(2 ** bits - 1)
+
+
+def is_counter_row(fields):
+    """
+    :param fields: list [bytes] split row, thousands separators removed
+    :return: bool, True for "event  tsc  value ..." rows
+    """
+    return len(fields) >= 3 and fields[1].isdigit() and \
+        fields[2].lstrip(b"-").isdigit()
+
 
 class EMONEvent(list):
     """
@@ -20,19 +62,572 @@ class EMONEvent(list):
         return "%s: %s: [%s]" % (self.name, self.ts, " ".join(map(str, self)))
 
 
+class EMONEventBuffer(object):
+    """
+    Growing int64 storage of the samples of one event, the capacity is
+    doubled when full so rows are appended in amortized O(1).
+    """
+    initial_capacity = 1024
+
+    def __init__(self, name, units, capacity=None):
+        """
+        :param name: str event name
+        :param units: int values per sample (cpu, uncore unit ...)
+        :param capacity: int samples to preallocate, when known
+        """
+        if capacity is None or capacity < 1:
+            capacity = self.initial_capacity
+
+        self.name = name
+        self.size = 0
+        self.ts = np.empty(capacity, dtype=np.int64)
+        self.blocks = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty((capacity, units), dtype=np.int64)
+
+    def append(self, ts, values, block=0):
+        """
+        :param ts: bytes | int sample time stamp counter
+        :param values: list [bytes | int]
+        :param block: int sample block number of the row
+        :return: None
+        """
+        if len(values) != self.values.shape[1]:
+            raise EMONDataError("%s has %s values, expected %s"
+                                % (self.name, len(values),
+                                   self.values.shape[1]))
+
+        if self.size == len(self.ts):
+            capacity = len(self.ts) * 2
+            self.ts = np.resize(self.ts, capacity)
+            self.blocks = np.resize(self.blocks, capacity)
+            self.values = np.resize(self.values,
+                                    (capacity, self.values.shape[1]))
+
+        self.ts[self.size] = ts
+        self.blocks[self.size] = block
+        self.values[self.size] = values
+        self.size += 1
+
+    def extend(self, other, block_offset=0):
+        """
+        Append all samples of another buffer of the same event
+
+        :param other: EMONEventBuffer
+        :param block_offset: int added to block numbers of other
+        :return: None
+        """
+        if other.values.shape[1] != self.values.shape[1]:
+            raise EMONDataError("%s has %s values, expected %s"
+                                % (self.name, other.values.shape[1],
+                                   self.values.shape[1]))
+
+        size = self.size + other.size
+        if size > len(self.ts):
+            capacity = max(size, len(self.ts) * 2)
+            self.ts = np.resize(self.ts, capacity)
+            self.blocks = np.resize(self.blocks, capacity)
+            self.values = np.resize(self.values,
+                                    (capacity, self.values.shape[1]))
+
+        self.ts[self.size:size] = other.ts[:other.size]
+        self.blocks[self.size:size] = other.blocks[:other.size] + block_offset
+        self.values[self.size:size] = other.values[:other.size]
+        self.size = size
+
+    def shrink(self):
+        """
+        Release the unused capacity, e.g. before sending to another process
+
+        :return: None
+        """
+        self.ts = self.ts[:self.size].copy()
+        self.blocks = self.blocks[:self.size].copy()
+        self.values = self.values[:self.size].copy()
+
+    def to_arrays(self):
+        """
+        :return: (ts: [samples] int64, values: [samples, units] int64)
+        """
+        return self.ts[:self.size].copy(), self.values[:self.size].copy()
+
+
+def demultiplex(rows, wanted=None, start=0, stop=None):
+    """
+    Split raw rows into per-event buffers. Sample blocks are numbered from
+    0, a separator only starts a new block after counter rows.
+
+    :param rows: iterable [bytes] lines of an emon -i output
+    :param wanted: set {bytes} event names, None for all
+    :param start: int first sample block to keep
+    :param stop: int | None, reading ends at this block
+    :return: (dict {bytes: EMONEventBuffer}, int number of blocks seen)
+    """
+    buffers = {}
+    if stop is not None and stop <= start:
+        return buffers, 0
+
+    block, has_rows = 0, False
+    for row in rows:
+        if row.startswith(SAMPLE_SEPARATOR):
+            if has_rows:
+                block, has_rows = block + 1, False
+                if stop is not None and block >= stop:
+                    break
+            continue
+
+        fields = row.replace(b",", b"").split()
+        # sample rows: name, time stamp counter, values...
+        if not is_counter_row(fields):
+            continue
+        has_rows = True
+
+        name = fields[0]
+        if block < start or (wanted is not None and name not in wanted):
+            continue
+
+        buffer = buffers.get(name)
+        if buffer is None:
+            buffer = EMONEventBuffer(name.decode("utf-8"), len(fields) - 2)
+            buffers[name] = buffer
+        buffer.append(fields[1], fields[2:], block)
+
+    return buffers, block + 1 if has_rows else block
+
+
+class EMONRawIndex(object):
+    """
+    Byte offsets of the sample blocks of an emon -i output file and of the
+    event rows inside them. Saved next to the raw file and validated by
+    file size and mtime.
+    """
+    suffix = ".rawidx.npz"
+
+    def __init__(self, filename):
+        """
+        :param filename: str plain (not compressed) raw file
+        """
+        self.filename = filename
+
+        self.events = None  # [str] event names, row_event are positions
+        self.blocks = None  # [int64] start offset of every block + file end
+        self.row_offsets = None  # [int64] start offset of every event row
+        self.row_lengths = None  # [int32]
+        self.row_event = None  # [int32]
+        self.row_block = None  # [int32]
+
+    @property
+    def index_filename(self):
+        return self.filename + self.suffix
+
+    def _file_state(self):
+        stat = os.stat(self.filename)
+        return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    def load(self):
+        """
+        Load the saved index
+
+        :return: bool, False when missing or out of date
+        """
+        try:
+            with np.load(self.index_filename) as saved:
+                if not np.array_equal(saved["state"], self._file_state()):
+                    return False
+                self.events = saved["events"].tolist()
+                for name in ("blocks", "row_offsets", "row_lengths",
+                             "row_event", "row_block"):
+                    setattr(self, name, saved[name])
+        except (OSError, KeyError, ValueError, EOFError,
+                zipfile.BadZipFile):
+            return False  # missing, or written partly by an old version
+
+        return True
+
+    def build(self):
+        """
+        Scan the raw file and save the index next to it
+
+        :return: None
+        """
+        events, blocks = {}, []
+        offsets, lengths, codes, block_ids = [], [], [], []
+
+        lines = LineOffsetIndex(self.filename)
+        try:
+            data = lines._map
+            block, has_rows = 0, False
+            for start, end in lines.spans():
+                row = data[start:end]
+                if row.startswith(SAMPLE_SEPARATOR):
+                    if has_rows:
+                        block, has_rows = block + 1, False
+                    continue
+
+                fields = row.replace(b",", b"").split()
+                if not is_counter_row(fields):
+                    continue
+
+                if not has_rows:
+                    blocks.append(start)
+                    has_rows = True
+
+                name = fields[0].decode("utf-8")
+                offsets.append(start)
+                lengths.append(end - start)
+                codes.append(events.setdefault(name, len(events)))
+                block_ids.append(block)
+            blocks.append(lines.size)
+        finally:
+            lines.close()
+
+        self.events = list(events.keys())
+        self.blocks = np.array(blocks, dtype=np.int64)
+        self.row_offsets = np.array(offsets, dtype=np.int64)
+        self.row_lengths = np.array(lengths, dtype=np.int32)
+        self.row_event = np.array(codes, dtype=np.int32)
+        self.row_block = np.array(block_ids, dtype=np.int32)
+
+        try:
+            save_npz(self.index_filename, events=np.array(self.events),
+                     blocks=self.blocks, row_offsets=self.row_offsets,
+                     row_lengths=self.row_lengths, row_event=self.row_event,
+                     row_block=self.row_block, state=self._file_state())
+        except OSError:
+            pass  # read-only data folder, keep the index in memory only
+
+    @property
+    def samples(self):
+        """
+        :return: int number of sample blocks
+        """
+        return len(self.blocks) - 1
+
+    def byte_range(self, start=0, stop=None):
+        """
+        Bytes covering sample blocks [start, stop)
+
+        :param start: int
+        :param stop: int | None for the last block
+        :return: (int, int)
+        """
+        start, stop, _ = slice(start, stop).indices(self.samples)
+        return int(self.blocks[start]), int(self.blocks[max(start, stop)])
+
+    def split(self, parts):
+        """
+        Cut the samples into ranges of about the same byte size, e.g. for
+        parallel workers
+
+        :param parts: int
+        :return: list [(int, int)] sample block ranges [start, stop)
+        """
+        edges = np.linspace(self.blocks[0], self.blocks[-1], parts + 1)
+        edges = np.searchsorted(self.blocks, edges, side="left")
+        edges[0], edges[-1] = 0, self.samples
+        edges = np.unique(np.minimum(edges, self.samples))
+        return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:])]
+
+    def select(self, events=None, samples=None):
+        """
+        Rows of events in sample blocks
+
+        :param events: list [str] event names, None for all
+        :param samples: slice of sample blocks, None for all
+        :return: ndarray [int] row numbers
+        """
+        mask = np.ones(len(self.row_offsets), dtype=bool)
+        if events is not None:
+            codes = [self.events.index(e) for e in events
+                     if e in self.events]
+            mask &= np.isin(self.row_event, codes)
+        if samples is not None:
+            start, stop, _ = samples.indices(self.samples)
+            mask &= (self.row_block >= start) & (self.row_block < stop)
+        return np.flatnonzero(mask)
+
+
+class EMONColumnarStore(object):
+    """
+    Columnar copy of an emon -i output file: one .npy array per event for
+    the values, time stamp counters and sample block numbers, opened
+    memory-mapped. A meta.json written at the last records the events,
+    their units and the size and mtime of the raw file.
+    """
+    suffix = ".columnar"
+
+    def __init__(self, filename, path=None):
+        """
+        :param filename: str raw file the store is built from
+        :param path: str store folder, default is <raw>.columnar
+        """
+        self.filename = filename
+        self.path = filename + self.suffix if path is None else path
+        self.meta = None
+
+    def _file_state(self):
+        stat = os.stat(self.filename)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def load(self):
+        """
+        :return: bool, False when missing or out of date
+        """
+        try:
+            with open(os.path.join(self.path, "meta.json"), "r") as fd:
+                meta = json.load(fd)
+        except (OSError, ValueError):
+            return False
+
+        if meta.get("state") != self._file_state():
+            return False
+        self.meta = meta
+        return True
+
+    @property
+    def events(self):
+        return list(self.meta["events"].keys())
+
+    @property
+    def samples(self):
+        return self.meta["samples"]
+
+    def _array(self, event, kind):
+        name = "%s.%s.npy" % (self.meta["events"][event]["id"], kind)
+        return np.load(os.path.join(self.path, name), mmap_mode="r")
+
+    def read(self, event, samples=None):
+        """
+        :param event: str
+        :param samples: slice of sample blocks, None for all
+        :return: (ts: [samples] int64, values: [samples, units] int64),
+            memory-mapped read-only arrays
+        """
+        ts, values = self._array(event, "ts"), self._array(event, "values")
+        if samples is None:
+            return ts, values
+
+        start, stop, _ = samples.indices(self.samples)
+        blocks = self._array(event, "blocks")
+        first, last = np.searchsorted(blocks, [start, max(start, stop)])
+        return ts[first:last], values[first:last]
+
+    def write(self, buffers, samples):
+        """
+        Write the store into a sibling temporary folder, then move it in
+        place. An existing folder is only replaced if it is a store.
+
+        :param buffers: list [EMONEventBuffer]
+        :param samples: int number of sample blocks
+        :return: None
+        """
+        if os.path.lexists(self.path) and not os.path.isfile(
+                os.path.join(self.path, "meta.json")):
+            raise EMONDataError("%s exists and is not a columnar store"
+                                % self.path)
+
+        state = self._file_state()
+        parent, name = os.path.split(os.path.abspath(self.path))
+        temp = tempfile.mkdtemp(prefix=name + ".", suffix=".tmp", dir=parent)
+        old = None
+        try:
+            events = {}
+            for number, buffer in enumerate(buffers):
+                size = buffer.size
+                for kind, array in (("ts", buffer.ts),
+                                    ("blocks", buffer.blocks),
+                                    ("values", buffer.values)):
+                    np.save(os.path.join(temp, "%s.%s.npy" % (number, kind)),
+                            array[:size])
+                events[buffer.name] = {"id": number, "samples": size,
+                                       "units": buffer.values.shape[1]}
+
+            with open(os.path.join(temp, "meta.json"), "w") as fd:
+                json.dump({"state": state, "samples": samples,
+                           "events": events}, fd)
+
+            # a folder can not be replaced by a rename, move the old aside
+            if os.path.lexists(self.path):
+                old = tempfile.mkdtemp(prefix=name + ".", suffix=".old",
+                                       dir=parent)
+                os.replace(self.path, os.path.join(old, name))
+            os.replace(temp, self.path)
+        except BaseException:
+            if old is not None and not os.path.lexists(self.path):
+                os.replace(os.path.join(old, name), self.path)
+            shutil.rmtree(temp, ignore_errors=True)
+            raise
+
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def find_block_boundaries(filename, parts):
+    """
+    Cut a plain raw file into byte ranges of about the same size, each
+    range starts at a sample separator so no block is split.
+
+    :param filename: str
+    :param parts: int
+    :return: list [(int, int)] byte ranges
+    """
+    size = os.path.getsize(filename)
+    if size == 0:
+        return []
+
+    edges = [0]
+    with open(filename, "rb") as fd, \
+            mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for part in range(1, parts):
+            pos = data.find(b"\n" + SAMPLE_SEPARATOR,
+                            max(edges[-1], size * part // parts))
+            if pos == -1:
+                break
+            if pos + 1 > edges[-1]:
+                edges.append(pos + 1)
+    edges.append(size)
+
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _demultiplex_byte_range(filename, start, end):
+    """
+    Worker entry for convert_raw_file, module level to be picklable
+
+    :return: (dict {bytes: EMONEventBuffer}, int number of blocks)
+    """
+    with open(filename, "rb") as fd:
+        fd.seek(start)
+        rows = fd.read(end - start).splitlines()
+
+    buffers, blocks = demultiplex(rows)
+    for buffer in buffers.values():
+        buffer.shrink()
+    return buffers, blocks
+
+
+def convert_raw_file(filename, path=None, workers=None):
+    """
+    Parse an emon -i output in parallel and save it as EMONColumnarStore.
+    Byte ranges aligned on sample blocks are parsed by a process pool, and
+    block numbers are shifted by the blocks of the ranges before.
+
+    :param filename: str
+    :param path: str store folder, default is <raw>.columnar
+    :param workers: int pool size, None for the cpu count
+    :return: EMONColumnarStore
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if get_compression(filename) is not None:
+        # streams can not be split, decompress and parse in one pass
+        with open_file(filename, "rb") as fd:
+            results = [demultiplex(fd)]
+    else:
+        ranges = find_block_boundaries(filename, workers)
+        if workers == 1 or len(ranges) <= 1:
+            results = [_demultiplex_byte_range(filename, *r) for r in ranges]
+        else:
+            with ProcessPoolExecutor(workers) as executor:
+                results = list(executor.map(
+                    _demultiplex_byte_range, [filename] * len(ranges),
+                    [r[0] for r in ranges], [r[1] for r in ranges]))
+
+    merged, samples = {}, 0
+    for buffers, blocks in results:
+        for name, buffer in buffers.items():
+            if name not in merged:
+                merged[name] = EMONEventBuffer(buffer.name,
+                                               buffer.values.shape[1])
+            merged[name].extend(buffer, samples)
+        samples += blocks
+
+    store = EMONColumnarStore(filename, path)
+    store.write(list(merged.values()), samples)
+    store.load()
+    return store
+
+
 class EMONRawFile:
     """
     Read EMON raw data from emon -i output file.
     """
+    # read from EMONColumnarStore when one is saved for the file
+    use_store = True
+    _store = None
+
+    # build / load EMONRawIndex on first access, plain files only
+    use_index = True
+    _index = None
+
+    # emon -i reports counts per sample, set True for running readings
+    cumulative = False
+    counter_bits = 48  # width of PMU counters
+    tsc_freq = None  # Hz, required for rates per second
+
     def __init__(self, filename):
         self.filename = filename
 
+    @property
+    def index(self):
+        """
+        Sample block index of the file, loaded or built lazily
+
+        :return: EMONRawIndex | None when disabled or file is compressed
+        """
+        if not self.use_index or get_compression(self.filename) is not None:
+            return None
+
+        if self._index is None:
+            index = EMONRawIndex(self.filename)
+            if not index.load():
+                index.build()
+            self._index = index
+        return self._index
+
+    @property
+    def store(self):
+        """
+        Columnar copy of the file, when converted and still up to date
+
+        :return: EMONColumnarStore | None
+        """
+        if not self.use_store:
+            return None
+
+        if self._store is None or not self._store.load():
+            store = EMONColumnarStore(self.filename)
+            self._store = store if store.load() else None
+        return self._store
+
+    def convert(self, workers=None):
+        """
+        Build the columnar store, later reads use it by default
+
+        :param workers: int process pool size, None for the cpu count
+        :return: EMONColumnarStore
+        """
+        self._store = convert_raw_file(self.filename, workers=workers)
+        return self._store
+
+    @property
+    def samples(self):
+        """
+        :return: int number of sample blocks, None without store or index
+        """
+        store = self.store
+        if store is not None:
+            return store.samples
+
+        index = self.index
+        return None if index is None else index.samples
+
     def __getitem__(self, event_name):
         """
         return an iterator for dedicate event
         """
         self.event = event_name
-        fd = open(self.filename)
+        fd = open_file(self.filename)
         while True:
             row = str(fd.readline())
             if row.startswith(self.event):
@@ -41,8 +636,171 @@ class EMONRawFile:
                 break
         fd.close()
 
-    def to_dataframe(self, event_name: str) -> pandas.DataFrame:
+    def to_dataframe(self, event_name: str,
+                     samples=None) -> pandas.DataFrame:
         """
         Return a dataframe of event
+
+        :param event_name: str exact event name
+        :param samples: slice of sample blocks, None for all
+        """
+        counters = self.read_events([event_name], samples)
+        if event_name not in counters:
+            return pandas.DataFrame()
+        return pandas.DataFrame(counters[event_name][1])
+
+    def read_events(self, events=None, samples=None):
+        """
+        Demultiplex events in one pass over the file, only the rows of the
+        events are read when the file is indexed. The columnar store is
+        used instead of the file whenever it exists.
+
+        :param events: list [str] exact event names, None for all events
+        :param samples: slice of sample blocks, None for all
+        :return: dict {str: (ts, values)}, see EMONEventBuffer.to_arrays,
+            read-only memory-mapped arrays when read from the store
+        """
+        store = self.store
+        if store is not None:
+            if events is None:
+                events = store.events
+            counters = {}
+            for event in events:
+                if event in store.meta["events"]:
+                    ts, values = store.read(event, samples)
+                    if len(ts) > 0:
+                        counters[event] = (ts, values)
+            return counters
+
+        if self.index is not None:
+            buffers = self._read_indexed(events, samples)
+        else:
+            buffers = self._read_scan(events, samples)
+
+        return {buffer.name: buffer.to_arrays()
+                for buffer in buffers.values()}
+
+    def _read_scan(self, events, samples):
+        wanted = None
+        if events is not None:
+            wanted = {event.encode("utf-8") for event in events}
+
+        start, stop = 0, None
+        if samples is not None:
+            start, stop = samples.start or 0, samples.stop
+
+        with open_file(self.filename, "rb") as fd:
+            return demultiplex(fd, wanted, start, stop)[0]
+
+    def _read_indexed(self, events, samples):
+        index = self.index
+        rows = index.select(events, samples)
+        if len(rows) == 0:
+            return {}
+
+        codes = index.row_event[rows]
+        counts = np.bincount(codes, minlength=len(index.events))
+
+        buffers = {}
+        with open(self.filename, "rb") as fd, \
+                mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for offset, length, code, block in zip(
+                    index.row_offsets[rows].tolist(),
+                    index.row_lengths[rows].tolist(), codes.tolist(),
+                    index.row_block[rows].tolist()):
+                fields = data[offset:offset + length].replace(
+                    b",", b"").split()
+
+                buffer = buffers.get(code)
+                if buffer is None:
+                    buffer = EMONEventBuffer(index.events[code],
+                                             len(fields) - 2, counts[code])
+                    buffers[code] = buffer
+                buffer.append(fields[1], fields[2:], block)
+
+        return buffers
+
+    def get_deltas(self, events=None, samples=None):
+        """
+        Counts and TSC cycles of every sample interval
+
+        :param events: list [str] exact event names, None for all events
+        :param samples: slice of sample blocks, None for all
+        :return: dict {str: (cycles: [n] int64, counts: [n, units] int64)}
+        """
+        deltas = {}
+        for event, (ts, values) in self.read_events(events, samples).items():
+            counts = counter_delta(values, self.counter_bits, self.cumulative)
+            if self.cumulative:
+                ts = np.diff(ts)
+            deltas[event] = (ts, counts)
+        return deltas
+
+    def get_rates(self, events=None, per="second", view=None, topology=None,
+                  samples=None, tsc_freq=None):
+        """
+        Event rates of every sample interval, optionally summed per view
+        column (system, socket, core, thread) before dividing.
+
+        :param events: list [str] exact event names, None for all events
+        :param per: str "second" | "cycle" (TSC cycle)
+        :param view: str EMONReader.SYSTEM | SOCKET | CORE | THREAD | None
+        :param topology: list [(socket, core, thread)] of each cpu column
+        :param samples: slice of sample blocks, None for all
+        :param tsc_freq: float Hz, defaults to tsc_freq of the reader
+        :return: dict {str: data frame}, elapsed time as index
+        """
+        tsc_freq = self.tsc_freq if tsc_freq is None else tsc_freq
+        if per == "second" and tsc_freq is None:
+            raise EMONDataError("tsc_freq is required for rates per second")
+        if per not in ("second", "cycle"):
+            raise EMONDataError("Unknown rate unit %s" % per)
+
+        deltas = self.get_deltas(events, samples)
+        if len(deltas) == 0:
+            return {}
+
+        labels = {}
+        if view is not None:
+            cpus = len(topology) if topology is not None else \
+                max(counts.shape[1] for _, counts in deltas.values())
+            counts, names = group_counters(
+                {k: v[1] for k, v in deltas.items()}, view, cpus, topology)
+            deltas = {k: (deltas[k][0], counts[k]) for k in deltas}
+            labels = dict.fromkeys(deltas, names)
+
+        rates = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for event, (cycles, counts) in deltas.items():
+                interval = cycles.astype(np.float64)
+                if per == "second":
+                    interval /= tsc_freq
+                values = counts / interval[:, np.newaxis]
+
+                elapsed = np.cumsum(interval)
+                rates[event] = pandas.DataFrame(
+                    values, index=pandas.Index(elapsed, name="elapsed"),
+                    columns=labels.get(event))
+        return rates
+
+    def get_event_array(self, event_name: str):
+        """
+        Return the samples of an event as arrays
+
+        :param event_name: str exact event name
+        :return: (ts: [samples] int64, values: [samples, units] int64)
+        """
+        return self.get_counters([event_name])[event_name]
+
+    def get_counters(self, events):
+        """
+        :param events: list [str] event names
+        :return: dict {str: (ts, values)}, empty arrays for events which
+            are not found
         """
-        return pandas.DataFrame(self[event_name])
+        counters = self.read_events(events)
+        for event in events:
+            if event not in counters:
+                counters[event] = (np.zeros(0, dtype=np.int64),
+                                   np.zeros((0, 0), dtype=np.int64))
+        return counters
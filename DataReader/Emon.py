@@ -1,17 +1,34 @@
+import csv
 import os
+import re
 import xml.etree.cElementTree as ET
+import zipfile
 from abc import ABCMeta
 
+import numpy as np
 import pandas as pd
 
 from .base import DataReaderError
+from .cache_manager import cache_manager
+from .compression import COMPRESSED_EXTENSIONS, get_compression, open_file
+from .disk_cache import DiskCache, save_npz
+from .emon_formula import EMONFormulaError, FormulaParser
+from .helper import CPUCoreList
+from .line_index import LineOffsetIndex
 
 __all__ = ["EMONSummaryData", "EMONDetailData", "EMONMetricFormulaReader",
-           "TopDownHelper"]
+           "TopDownHelper", "TMATree", "EMONQuery", "EMONTimestampIndex",
+           "EMONTopology"]
 
 # here is the version number from EDP
 __ver__ = "4.2"
 
+PYARROW_SUPPORT = True
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    PYARROW_SUPPORT = False
+
 
 class EMONReaderError(DataReaderError):
     pass
@@ -25,6 +42,188 @@ EMONSummaryData = pd.DataFrame
 EMONDetailData = pd.DataFrame
 
 
+def group_reduce(values, groups, ufunc=np.add):
+    """
+    Reduce columns sharing the same group id with one reduceat call
+
+    :param values: ndarray [rows, columns]
+    :param groups: ndarray [columns] group id of each column
+    :param ufunc: numpy ufunc np.add | np.maximum | np.minimum
+    :return: (ndarray [groups] ids, ndarray [rows, groups])
+    """
+    groups = np.asarray(groups)
+    order = np.argsort(groups, kind="stable")
+    groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    return groups[starts], ufunc.reduceat(values[:, order], starts, axis=1)
+
+
+class EMONTopology(object):
+    """
+    (socket, core, thread, cpu) of every column of a core or thread view,
+    parsed once from the column headers, e.g. "socket 0 core 3 thread 1".
+    Columns without a socket number (timestamp ...) are ignored. The logical
+    cpu numbers are taken from the headers or from the cpus mapping given
+    (e.g. from lscpu), they are never guessed from the column order.
+    """
+    _pattern = re.compile(r"(socket|core|thread|cpu)\s*(\d+)", re.I)
+
+    LEVELS = {"system": 0, "socket": 1, "core": 2, "thread": 3}
+
+    def __init__(self, columns, cpus=None):
+        """
+        :param columns: list [str] view column headers
+        :param cpus: list [int] logical cpu of each topology column |
+            dict {(socket, core, thread): cpu}, when the headers have no
+            cpu number
+        """
+        self.columns = []
+        rows = []
+        for column in columns:
+            fields = {k.lower(): int(v)
+                      for k, v in self._pattern.findall(str(column))}
+            if "socket" not in fields:
+                continue
+            self.columns.append(column)
+            rows.append([fields["socket"], fields.get("core", -1),
+                         fields.get("thread", -1), fields.get("cpu", -1)])
+
+        # [columns, 4] socket, core, thread, cpu, -1 when unknown
+        self.index = np.array(rows, dtype=np.int64).reshape(-1, 4)
+        if isinstance(cpus, dict):
+            cpus = [cpus.get(tuple(int(i) for i in row[:3]), -1)
+                    for row in self.index]
+        if cpus is not None:
+            if len(cpus) != len(rows):
+                raise EMONDataError("%s cpus are given for %s columns"
+                                    % (len(cpus), len(rows)))
+            self.index[:, 3] = cpus
+
+    def __len__(self):
+        return len(self.columns)
+
+    @property
+    def cpus(self):
+        return self.index[:, 3]
+
+    def groups(self, level):
+        """
+        :param level: str "system" | "socket" | "core" | "thread"
+        :return: (ndarray [columns] group id, list [str] labels)
+        """
+        if level not in self.LEVELS:
+            raise EMONDataError("Unknown topology level %s" % level)
+
+        depth = self.LEVELS[level]
+        if depth == 0:
+            return np.zeros(len(self), dtype=np.int64), ["aggregated"]
+
+        keys = self.index[:, :depth]
+        if (keys < 0).any():
+            raise EMONDataError("%s numbers are not in the view columns"
+                                % level)
+
+        label = " ".join(["socket %s", "core %s", "thread %s"][:depth])
+        unique, groups = np.unique(keys, axis=0, return_inverse=True)
+        return groups.reshape(-1), [label % tuple(k) for k in unique]
+
+    def values(self, data):
+        """
+        :param data: data frame view
+        :return: ndarray [rows, columns] float64 of the topology columns
+        """
+        return data[self.columns].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    @staticmethod
+    def reduce(values, groups, how="mean"):
+        """
+        Reduce columns per group, NaN are skipped
+
+        :param values: ndarray [rows, columns]
+        :param groups: ndarray [columns] group id
+        :param how: str "sum" | "mean" | "max" | "min"
+        :return: ndarray [rows, groups], NaN for groups without value
+        """
+        valid = ~np.isnan(values)
+        counts = group_reduce(valid.astype(np.int64), groups)[1]
+
+        if how in ("sum", "mean"):
+            result = group_reduce(np.where(valid, values, 0.0), groups)[1]
+            if how == "mean":
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    result = result / counts
+        elif how in ("max", "min"):
+            ufunc, fill = (np.maximum, -np.inf) if how == "max" \
+                else (np.minimum, np.inf)
+            result = group_reduce(np.where(valid, values, fill), groups,
+                                  ufunc)[1]
+        else:
+            raise EMONDataError("Unknown reduction %s" % how)
+
+        return np.where(counts > 0, result, np.nan)
+
+    def rollup(self, data, level, how="mean"):
+        """
+        Roll a view up to a coarser level, e.g. thread -> core -> socket
+
+        :param data: data frame view, metrics as index
+        :param level: str "system" | "socket" | "core" | "thread"
+        :param how: str "sum" | "mean" | "max" | "min"
+        :return: data frame, level columns
+        """
+        groups, labels = self.groups(level)
+        result = self.reduce(self.values(data), groups, how)
+        return pd.DataFrame(result, index=data.index, columns=labels)
+
+    def membership(self, cpu_sets):
+        """
+        :param cpu_sets: dict {label: CPUCoreList | str | list [int]}
+        :return: ndarray [columns, sets] bool
+        """
+        matrix = np.zeros((len(self), len(cpu_sets)), dtype=bool)
+        for i, cpu_set in enumerate(cpu_sets.values()):
+            if not isinstance(cpu_set, CPUCoreList):
+                cpu_set = CPUCoreList(cpu_set)
+            matrix[:, i] = np.isin(self.cpus, cpu_set.get_list())
+        return matrix
+
+    def rollup_cpus(self, data, cpu_sets, how="mean"):
+        """
+        Roll up arbitrary, possibly overlapping, cpu sets of a thread view
+
+        :param data: data frame view, metrics as index
+        :param cpu_sets: dict {label: CPUCoreList | str | list [int]}
+        :param how: str "sum" | "mean" | "max" | "min"
+        :return: data frame, one column per cpu set
+        """
+        if (self.cpus < 0).any():
+            raise EMONDataError("cpu numbers are not known for the view, "
+                                "give the cpus mapping (e.g. from lscpu)")
+
+        values = self.values(data)
+        matrix = self.membership(cpu_sets)
+        valid = ~np.isnan(values)
+        counts = valid.astype(np.float64) @ matrix
+
+        if how in ("sum", "mean"):
+            result = np.where(valid, values, 0.0) @ matrix
+            if how == "mean":
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    result = result / counts
+        elif how in ("max", "min"):
+            fill = -np.inf if how == "max" else np.inf
+            masked = np.where(valid[:, :, None] & matrix[None, :, :],
+                              values[:, :, None], fill)
+            result = masked.max(axis=1) if how == "max" \
+                else masked.min(axis=1)
+        else:
+            raise EMONDataError("Unknown reduction %s" % how)
+
+        result = np.where(counts > 0, result, np.nan)
+        return pd.DataFrame(result, index=data.index,
+                            columns=list(cpu_sets.keys()))
+
+
 class EMONReader:
     """
     Base Emon/edp csv data reader
@@ -44,8 +243,23 @@ class EMONReader:
     excel_file_name = None
     _excel_sheet_name_format = "%s %s"
 
+    # views loaded together in one pass over the workbook, None to parse
+    # each sheet on its first access
+    excel_views = None
+    # folder to keep the sheets in columnar form (parquet), the workbook
+    # is only opened once while the file is unchanged
+    excel_cache_path = None
+    _excel_sheets = None  # parsed sheets {sheet name: df}
+    _excel_book = None  # opened pd.ExcelFile
+
     metric_list = None
 
+    # csv ingestion options, see read_csv
+    csv_engine = "c"
+    float_dtype = "float64"
+    parse_timestamp = False
+    categorical_index = False
+
     def __init__(self, path):
         """
         :param path: folder which contains emon/edp csv files or excel file
@@ -55,31 +269,324 @@ class EMONReader:
 
         if os.path.isdir(path):
             self.csv_files_path = path
+        elif path.lower().endswith(".zip"):
+            self.zip_file_name = path
         else:
             self.excel_file_name = path
 
+    zip_file_name = None  # emon_data.zip given as path
+    _archive = None  # opened zipfile.ZipFile
+
+    @property
+    def archive_file_name(self):
+        """
+        The zip archive views can be read from
+
+        :return: str | None
+        """
+        if self.zip_file_name is not None:
+            return self.zip_file_name
+
+        if self.csv_files_path is not None:
+            filename = os.path.join(self.csv_files_path, self.archived_file)
+            if os.path.exists(filename):
+                return filename
+        return None
+
+    @property
+    def archive(self):
+        """
+        Opened zip archive, only the central directory is read here
+
+        :return: zipfile.ZipFile | None
+        """
+        if self._archive is None and self.archive_file_name is not None:
+            self._archive = zipfile.ZipFile(self.archive_file_name)
+        return self._archive
+
+    @property
+    def excel_book(self):
+        """
+        Opened workbook, kept open to parse sheets one by one
+
+        :return: pd.ExcelFile | None
+        """
+        if self._excel_book is None and self.excel_file_name is not None:
+            self._excel_book = pd.ExcelFile(self.excel_file_name)
+        return self._excel_book
+
+    def find_archive_member(self, filename):
+        """
+        :param filename: str view file name, may be in a sub folder of zip
+        :return: str member name
+        """
+        if self.archive is not None:
+            for name in self.archive.namelist():
+                if os.path.basename(name) == filename:
+                    return name
+
+        raise EMONReaderError(
+            "%s is not exist in %s" % (filename, self.archive_file_name))
+
+    def view_file(self, view):
+        """
+        Plain or compressed csv file of a view on disk
+
+        :param view: str
+        :return: str | None when the view is only in the archive
+        """
+        if self.csv_files_path is None:
+            return None
+
+        filename = os.path.join(self.csv_files_path,
+                                self._csv_file_filename_format % view)
+        try:
+            return self.find_csv_file(filename)
+        except EMONReaderError:
+            if self.archive_file_name is None:
+                raise
+            return None
+
+    def open_view(self, view):
+        """
+        Open the csv of a view as a binary stream, from disk or zip archive
+
+        :param view: str
+        :return: file object
+        """
+        filename = self.view_file(view)
+        if filename is not None:
+            return open_file(filename, "rb")
+
+        member = self.find_archive_member(
+            self._csv_file_filename_format % view)
+        return self.archive.open(member)
+
+    def list_views(self):
+        """
+        Views available from csv files or zip archive, nothing is
+        decompressed.
+
+        :return: list [str]
+        """
+        names = []
+        if self.csv_files_path is not None:
+            names.extend(os.listdir(self.csv_files_path))
+        if self.archive is not None:
+            names.extend(os.path.basename(i) for i in self.archive.namelist())
+
+        prefix, suffix = self._csv_file_filename_format.split("%s")
+        views = []
+        for name in names:
+            for ext in COMPRESSED_EXTENSIONS.keys():
+                if name.endswith(suffix + ext):
+                    name = name[:-len(ext)]
+            if name.startswith(prefix) and name.endswith(suffix):
+                view = name[len(prefix):len(name) - len(suffix)]
+                if view not in views:
+                    views.append(view)
+
+        return views
+
+    # parsed views {(view, metrics): df}, shared by all view accesses
+    _view_cache = None
+
     def get_file_content(self, view, check_processing_state=False):
+        """
+        Get the data frame of a view, each view is parsed only once per
+        metric selection. Returned frames are cached, treat them as read-only.
+
+        :param view: str SYSTEM | SOCKET | CORE | THREAD
+        :return: data frame
+        """
         if self.metric_list is None or len(self.metric_list) == 0:
             usecols = None
         else:
             usecols = self.metric_list
 
-        if self.csv_files_path is not None:
-            filename = self._csv_file_filename_format % view
-            abs_filename = os.path.join(self.csv_files_path, filename)
+        key = (view, None if usecols is None else tuple(usecols))
+        if self._view_cache is not None and key in self._view_cache:
+            cache_manager.hit(self, "_view_cache")
+            return self._view_cache[key]
 
-            if not os.path.exists(abs_filename):
-                raise EMONReaderError(
-                    "CSV %s file is not exist" % abs_filename)
+        df = self.read_view(view, usecols)
 
-            df = self.read_csv(abs_filename, usecols)
+        if self._view_cache is None:
+            self._view_cache = {key: df}
+            cache_manager.register(self, "_view_cache")
+        else:
+            self._view_cache[key] = df
+            cache_manager.resize(self, "_view_cache")
+
+        return df
+
+    def clear_cache(self, view=None):
+        """
+        Drop parsed views, so they are read again on next access
+
+        :param view: str only drop this view, None for all
+        :return: None
+        """
+        if view is None:
+            for attr in ("_view_cache", "_excel_sheets"):
+                setattr(self, attr, None)
+                cache_manager.discard((id(self), attr))
+            return
+
+        if self._view_cache is not None:
+            for key in [k for k in self._view_cache if k[0] == view]:
+                del self._view_cache[key]
+            cache_manager.resize(self, "_view_cache")
+
+        if self._excel_sheets is not None:
+            self._excel_sheets.pop(self._excel_sheet_name_format % view, None)
+            cache_manager.resize(self, "_excel_sheets")
+
+    def read_view(self, view, usecols=None):
+        """
+        Parse a view from csv files or excel, without cache
+
+        :param view: str
+        :param usecols: list [str] metrics
+        :return: data frame
+        """
+        if self.csv_files_path is not None or self.zip_file_name is not None:
+            with self.open_view(view) as fd:
+                df = self.parse_csv(fd, usecols, self.csv_engine,
+                                    self.float_dtype, self.parse_timestamp,
+                                    self.categorical_index)
 
         if self.excel_file_name is not None:
-            sheet_name = self._excel_sheet_name_format % view
-            df = self.read_excel(self.excel_file_name, sheet_name, usecols)
+            df = self.get_excel_sheet(view)
+            if usecols is not None:
+                df = df[[c for c in usecols if c in df.columns]]
 
         return self.filter(df)
 
+    def get_excel_sheet(self, view):
+        """
+        Sheet of a view with all metrics. Only the requested sheet is parsed
+        from the workbook kept open, unless excel_views is set, then the
+        first access reads all of these sheets together.
+
+        :param view: str
+        :return: data frame
+        """
+        sheet_name = self._excel_sheet_name_format % view
+        if self._excel_sheets is not None and sheet_name in self._excel_sheets:
+            cache_manager.hit(self, "_excel_sheets")
+            return self._excel_sheets[sheet_name]
+
+        sheet_names = [sheet_name]
+        if self.excel_views is not None:
+            sheet_names += [self._excel_sheet_name_format % v
+                            for v in self.excel_views
+                            if self._excel_sheet_name_format % v != sheet_name]
+
+        sheets = self.read_excel_sheets(self.excel_file_name, sheet_names,
+                                        self.excel_cache_path,
+                                        lambda: self.excel_book)
+        if sheet_name not in sheets:
+            raise EMONReaderError("Sheet %s is not exist in %s"
+                                  % (sheet_name, self.excel_file_name))
+
+        if self._excel_sheets is None:
+            self._excel_sheets = sheets
+            cache_manager.register(self, "_excel_sheets")
+        else:
+            self._excel_sheets.update(sheets)
+            cache_manager.resize(self, "_excel_sheets")
+
+        return sheets[sheet_name]
+
+    @classmethod
+    def read_excel_sheets(cls, abs_filename, sheet_names, cache_path=None,
+                          open_book=None):
+        """
+        Read several sheets with one open of the workbook, missing sheets
+        are skipped.
+
+        :param abs_filename: str
+        :param sheet_names: list [str]
+        :param cache_path: str DiskCache folder for the columnar copy
+        :param open_book: function returning a pd.ExcelFile kept open by the
+            caller, None to open and close the workbook here
+        :return: dict {sheet name: df}
+        """
+        disk_cache, identity, sheets = None, None, {}
+        missing = list(sheet_names)
+        if cache_path is not None:
+            disk_cache = DiskCache(cache_path)
+            identity = DiskCache.file_identity([abs_filename])
+
+            # sheet names of the workbook, recorded when it was converted
+            book_sheets = disk_cache.load("%s:" % abs_filename, identity)
+            if book_sheets is not None:
+                missing = [i for i in missing
+                           if i in book_sheets["sheet"].tolist()]
+
+            for sheet_name in list(missing):
+                data = disk_cache.load(
+                    "%s:%s" % (abs_filename, sheet_name), identity)
+                if data is not None:
+                    sheets[sheet_name] = data
+                    missing.remove(sheet_name)
+
+        if len(missing) == 0:
+            return sheets
+
+        # the openpyxl backend streams the workbook in read-only mode
+        if open_book is None:
+            with pd.ExcelFile(abs_filename) as book:
+                return cls._parse_excel_sheets(book, abs_filename, missing,
+                                               sheets, disk_cache, identity)
+
+        return cls._parse_excel_sheets(open_book(), abs_filename, missing,
+                                       sheets, disk_cache, identity)
+
+    @classmethod
+    def _parse_excel_sheets(cls, book, abs_filename, sheet_names, sheets,
+                            disk_cache=None, identity=None):
+        if disk_cache is not None:
+            disk_cache.dump("%s:" % abs_filename, identity,
+                            pd.DataFrame({"sheet": book.sheet_names}))
+
+        for sheet_name in sheet_names:
+            if sheet_name not in book.sheet_names:
+                continue
+
+            data = book.parse(sheet_name, index_col=0, na_filter=False)
+            data = cls.format_excel_sheet(data)
+            sheets[sheet_name] = data
+            if disk_cache is not None:
+                disk_cache.dump("%s:%s" % (abs_filename, sheet_name),
+                                identity, data)
+
+        return sheets
+
+    @staticmethod
+    def format_excel_sheet(data):
+        for col in data.columns:
+            if col == "timestamp":
+                continue
+            data[col] = pd.to_numeric(data[col], errors="coerce")
+
+        return data
+
+    @staticmethod
+    def find_csv_file(abs_filename):
+        """
+        Locate a view file, which may be kept compressed (.gz, .xz ...)
+
+        :param abs_filename: str the plain csv filename
+        :return: str
+        """
+        for ext in [""] + list(COMPRESSED_EXTENSIONS.keys()):
+            if os.path.exists(abs_filename + ext):
+                return abs_filename + ext
+
+        raise EMONReaderError("CSV %s file is not exist" % abs_filename)
+
     def select_metric(self, metric):
         if type(metric) == list:
             self.metric_list = metric
@@ -89,33 +596,105 @@ class EMONReader:
     def filter(self, data_frame):
         return data_frame
 
-    @staticmethod
-    def read_csv(abs_filename, usecols=None):
-        data = pd.read_csv(abs_filename, index_col=0, na_filter=False,
-                           engine="c", sep=",", usecols=usecols,
-                           low_memory=False)
+    @classmethod
+    def read_csv(cls, abs_filename, usecols=None, engine=None,
+                 float_dtype=None, parse_timestamp=None,
+                 categorical_index=None):
+        """
+        Parse an EDP csv file, numeric columns are typed by the csv parser
+        directly, only columns with unexpected tokens are coerced later.
+
+        :param abs_filename: str
+        :param usecols: list [str]
+        :param engine: str "c" | "pyarrow" (multi-threaded)
+        :param float_dtype: str "float64" | "float32"
+        :param parse_timestamp: bool convert "timestamp" to datetime
+        :param categorical_index: bool keep metric names as categorical
+        :return: data frame
+        """
+        with open_file(abs_filename, "rb") as fd:
+            return cls.parse_csv(fd, usecols, engine, float_dtype,
+                                 parse_timestamp, categorical_index)
+
+    @classmethod
+    def parse_csv(cls, fd, usecols=None, engine=None, float_dtype=None,
+                  parse_timestamp=None, categorical_index=None):
+        """
+        Same as read_csv, from an opened file or stream
+
+        :param fd: file object
+        :return: data frame
+        """
+        engine = cls.csv_engine if engine is None else engine
+        if engine == "pyarrow" and not PYARROW_SUPPORT:
+            engine = "c"
+
+        options = dict(index_col=0, sep=",", usecols=usecols,
+                       keep_default_na=False, na_values=[""],
+                       engine=engine)
+        if engine == "c":
+            options["low_memory"] = False
+
+        data = pd.read_csv(fd, **options)
+        return cls.format_data(data, float_dtype, parse_timestamp,
+                               categorical_index)
+
+    @classmethod
+    def format_data(cls, data, float_dtype=None, parse_timestamp=None,
+                    categorical_index=None):
+        """
+        Convert columns of a freshly parsed view to their final types
+
+        :param data: data frame
+        :return: data frame
+        """
+        if float_dtype is None:
+            float_dtype = cls.float_dtype
+        if parse_timestamp is None:
+            parse_timestamp = cls.parse_timestamp
+        if categorical_index is None:
+            categorical_index = cls.categorical_index
 
         for col in data.columns:
             if col == "timestamp":
                 continue
-            data[col] = pd.to_numeric(data[col], errors="coerce")
+
+            values = data[col]
+            if not pd.api.types.is_numeric_dtype(values):
+                values = pd.to_numeric(values, errors="coerce")
+            if pd.api.types.is_float_dtype(values) and \
+                    values.dtype != float_dtype:
+                values = values.astype(float_dtype)
+            data[col] = values
+
+        if "timestamp" in data.columns:
+            if parse_timestamp:
+                data["timestamp"] = pd.to_datetime(data["timestamp"],
+                                                   errors="coerce")
+            elif not pd.api.types.is_numeric_dtype(data["timestamp"]):
+                # empty timestamps are kept as empty strings
+                data["timestamp"] = data["timestamp"].fillna("")
+
+        if data.index.hasnans:
+            # na_values is meant for the values, empty labels stay ''
+            data.index = data.index.fillna("")
+
+        if categorical_index:
+            data.index = pd.CategoricalIndex(data.index, name=data.index.name)
 
         return data
 
-    @staticmethod
-    def read_excel(abs_filename, sheet_name, usecols=None):
+    @classmethod
+    def read_excel(cls, abs_filename, sheet_name, usecols=None):
         data = pd.read_excel(abs_filename, sheet_name=sheet_name,
                              index_col=0, na_filter=False, usecols=usecols)
-        for col in data.columns:
-            if col == "timestamp":
-                continue
-            data[col] = pd.to_numeric(data[col], errors="coerce")
-
-        return data
+        return cls.format_excel_sheet(data)
 
     @property
     def raw_data_file(self):
-        if self.csv_files_path is not None:
+        if self.zip_file_name is not None:
+            filename = self.zip_file_name
+        elif self.csv_files_path is not None:
             filename = os.path.join(self.csv_files_path, self.archived_file)
         elif self.excel_file_name is not None:
             filename = self.excel_file_name
@@ -130,6 +709,8 @@ class EMONReader:
     def create_time(self):
         if self.csv_files_path is not None:
             path = self.csv_files_path
+        elif self.zip_file_name is not None:
+            path = self.zip_file_name
         elif self.excel_file_name is not None:
             path = self.excel_file_name
         else:
@@ -181,28 +762,93 @@ class EMONSummaryData(EMONReader):
     _csv_file_filename_format = "__edp_%s_view_summary.csv"
     _excel_sheet_name_format = "%s view"
 
-    def core_view_superset(self, socket=0, core=[0]):
-        if type(core) != type(list()):
-            core = [core]
-        column_name = ["socket %s core %s" % (socket, c) for c in core]
+    _topologies = None  # {view: EMONTopology}
 
-        socket_data = self.socket_view["socket %s" % socket]
-        df = pd.DataFrame(index=socket_data.index)
+    def topology(self, view=EMONReader.THREAD):
+        """
+        Topology of a core or thread view, parsed once per view
 
-        na_metrics = None
-        for col in column_name:
-            core_data = self.core_view[col]
-            if na_metrics is None:
-                na_metrics = core_data.isna()
+        :param view: str CORE | THREAD
+        :return: EMONTopology
+        """
+        if self._topologies is None:
+            self._topologies = {}
+        if view not in self._topologies:
+            self._topologies[view] = EMONTopology(
+                self.get_file_content(view).columns)
+        return self._topologies[view]
+
+    def rollup(self, level, view=EMONReader.THREAD, how="mean"):
+        """
+        :param level: str "system" | "socket" | "core"
+        :param view: str CORE | THREAD, the view rolled up
+        :param how: str "sum" | "mean" | "max" | "min"
+        :return: data frame
+        """
+        return self.topology(view).rollup(self.get_file_content(view),
+                                          level, how)
 
-            core_data[na_metrics] = socket_data[na_metrics]
-            df[col] = core_data
+    def rollup_cpus(self, cpu_sets, how="mean", cpus=None):
+        """
+        :param cpu_sets: dict {label: CPUCoreList | str | list [int]}
+        :param how: str "sum" | "mean" | "max" | "min"
+        :param cpus: logical cpu of the thread columns, see EMONTopology,
+            required when the headers have no cpu number
+        :return: data frame
+        """
+        if cpus is None:
+            topology = self.topology(self.THREAD)
+        else:
+            topology = EMONTopology(self.thread_view.columns, cpus)
+        return topology.rollup_cpus(self.thread_view, cpu_sets, how)
 
-        idx = socket_data.index[na_metrics]
-        df.index = df.index.map(
-            lambda x: "Uncore_%s" % x if x in idx else "Core_%s" % x)
+    def core_view_superset(self, socket=0, core=[0]):
+        """
+        Core view where uncore metrics (empty in core view) are taken from
+        the socket of each core
 
-        return df
+        :param socket: int | None for all sockets
+        :param core: int | list [int] | None for all cores
+        :return: data frame, "Core_" / "Uncore_" prefixed metrics
+        """
+        if core is not None and type(core) != type(list()):
+            core = [core]
+
+        core_view = self.core_view
+        topology = self.topology(self.CORE)
+        index = topology.index
+        selected = np.ones(len(topology), dtype=bool)
+        if socket is not None:
+            selected &= index[:, 0] == socket
+        if core is None:
+            positions = np.flatnonzero(selected)
+        else:
+            # columns follow the order of the requested cores
+            positions = np.concatenate(
+                [np.flatnonzero(selected & (index[:, 1] == c)) for c in core]
+                + [np.zeros(0, dtype=np.int64)])
+        if len(positions) == 0:
+            raise EMONDataError("No core column of socket %s core %s"
+                                % (socket, core))
+
+        socket_view = self.socket_view
+        columns = [topology.columns[i] for i in positions]
+        sockets = ["socket %s" % i for i in index[positions, 0]]
+
+        values = core_view[columns].reindex(socket_view.index).to_numpy(
+            dtype=np.float64, na_value=np.nan, copy=True)
+        socket_values = socket_view[sockets].to_numpy(dtype=np.float64,
+                                                      na_value=np.nan)
+
+        # metrics without value on the first requested core are uncore
+        uncore = np.isnan(values[:, 0])
+        values[uncore] = socket_values[uncore]
+
+        prefix = np.where(uncore, "Uncore_", "Core_")
+        metrics = pd.Index([p + str(i) for p, i in
+                            zip(prefix, socket_view.index)],
+                           name=socket_view.index.name)
+        return pd.DataFrame(values, index=metrics, columns=columns)
 
 
 class EMONDetailData(EMONReader):
@@ -211,34 +857,466 @@ class EMONDetailData(EMONReader):
 
     fill_empty_entries = "ffill"
 
+    # build and use EMONTimestampIndex for time window queries
+    use_time_index = True
+
     def select_metric(self, metric):
         super().select_metric(metric)
         self.metric_list.append("timestamp")
 
     def filter(self, data_frame):
         if self.fill_empty_entries:
-            data_frame = data_frame.fillna(method=self.fill_empty_entries)
+            # "ffill" | "bfill"
+            data_frame = getattr(data_frame, self.fill_empty_entries)()
 
         return data_frame
 
+    def query(self, view):
+        """
+        Build up a lazy query on a detail view, e.g.
+            reader.query(reader.SOCKET).metrics([...]).between(600, 1200)
+
+        :param view: str SYSTEM | SOCKET | CORE | THREAD
+        :return: EMONQuery
+        """
+        return EMONQuery(self, view)
+
+
+class EMONTimestampIndex(object):
+    """
+    Sparse index from sample timestamps to byte offsets of a detail csv file,
+    saved next to the csv file and validated by file size and mtime.
+    """
+    stride = 1000  # one entry per N samples
+    suffix = ".tsidx.npz"
+
+    def __init__(self, filename, timestamp_format=None, stride=None):
+        """
+        :param filename: str plain (not compressed) csv file
+        :param timestamp_format: str passed to pandas.to_datetime
+        :param stride: int samples per index entry
+        """
+        self.filename = filename
+        self.timestamp_format = timestamp_format
+        if stride is not None:
+            self.stride = stride
+
+        self.offsets = None
+        self.timestamps = None
+
+    @property
+    def index_filename(self):
+        return self.filename + self.suffix
+
+    @property
+    def origin(self):
+        """
+        Timestamp of the first sample
+
+        :return: Timestamp | None when no timestamp is known
+        """
+        if self.timestamps is None or len(self.timestamps) == 0:
+            return None
+        return pd.Timestamp(self.timestamps[0])
+
+    def _file_state(self):
+        stat = os.stat(self.filename)
+        return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    def load(self):
+        """
+        Load the saved index
+
+        :return: bool, False when missing or out of date
+        """
+        try:
+            with np.load(self.index_filename) as saved:
+                if not np.array_equal(saved["state"], self._file_state()):
+                    return False
+                self.offsets = saved["offsets"]
+                self.timestamps = saved["timestamps"]
+        except (OSError, KeyError, ValueError, EOFError,
+                zipfile.BadZipFile):
+            return False  # missing, or written partly by an old version
+
+        return len(self.offsets) > 0
+
+    def build(self):
+        """
+        Scan the csv file and save the index next to it
+
+        :return: None
+        """
+        lines = LineOffsetIndex(self.filename)
+        try:
+            header = next(csv.reader([lines[0]]))
+            column = header.index("timestamp")
+
+            rows = np.arange(1, len(lines), self.stride)
+            values = [next(csv.reader([lines[i]]), [""] * (column + 1))
+                      [column] for i in rows]
+            offsets = lines.offsets[rows]
+        finally:
+            lines.close()
+
+        timestamps = pd.to_datetime(pd.Series(values), errors="coerce",
+                                    format=self.timestamp_format)
+        valid = timestamps.notna().values
+        self.offsets = offsets[valid]
+        self.timestamps = timestamps[valid].values.astype("datetime64[ns]")
+
+        try:
+            save_npz(self.index_filename, offsets=self.offsets,
+                     timestamps=self.timestamps, state=self._file_state())
+        except OSError:
+            pass  # read-only data folder, keep the index in memory only
+
+    def seek(self, start):
+        """
+        Byte offset to begin reading samples at or after start
+
+        :param start: Timestamp | None
+        :return: int, 0 to read from the beginning (header)
+        """
+        if start is None or self.offsets is None or len(self.offsets) == 0:
+            return 0
+
+        # last entry strictly before start, earlier rows are all skipped
+        pos = np.searchsorted(self.timestamps,
+                              np.datetime64(pd.Timestamp(start), "ns"),
+                              side="left") - 1
+        if pos < 0:
+            return 0
+        return int(self.offsets[pos])
+
+
+class EMONQuery(object):
+    """
+    Lazy query on EMON detail views, the csv file is read in chunks, only
+    selected columns are parsed and rows out of the time window are dropped
+    chunk by chunk.
+    """
+    chunk_size = 50000  # rows per chunk
+    timestamp_format = None  # passed to pandas.to_datetime
+
+    def __init__(self, reader, view):
+        """
+        :param reader: EMONDetailData
+        :param view: str
+        """
+        self.reader = reader
+        self.view = view
+
+        self._metrics = None
+        self._pattern = None
+        self._start, self._end = None, None
+
+    def metrics(self, metrics):
+        """
+        :param metrics: str | list [str] column names
+        :return: EMONQuery
+        """
+        if isinstance(metrics, str):
+            metrics = [metrics]
+        self._metrics = list(metrics)
+        return self
+
+    def columns(self, pattern):
+        """
+        :param pattern: str regex searched in column names, e.g. "socket [01]"
+        :return: EMONQuery
+        """
+        self._pattern = re.compile(pattern)
+        return self
+
+    def between(self, start=None, end=None):
+        """
+        Time window of samples, numbers (seconds) and Timedelta are relative
+        to the first sample, str and Timestamp are absolute times.
+
+        :param start: None | float | str | Timedelta | Timestamp
+        :param end: None | float | str | Timedelta | Timestamp
+        :return: EMONQuery
+        """
+        self._start, self._end = start, end
+        return self
+
+    def select_columns(self, columns):
+        """
+        Apply metric and pattern selections to header names
+
+        :param columns: list [str] header of the view without index column
+        :return: list [str]
+        """
+        selected = []
+        for col in columns:
+            if col == "timestamp":
+                continue
+            if self._metrics is not None and col not in self._metrics:
+                continue
+            if self._pattern is not None and not self._pattern.search(col):
+                continue
+            selected.append(col)
+        return selected
+
+    def _to_time(self, value, origin):
+        if value is None:
+            return None
+        if isinstance(value, (int, float)):
+            value = pd.Timedelta(seconds=value)
+        if isinstance(value, pd.Timedelta):
+            return origin + value
+        return pd.Timestamp(value)
+
+    def get_data(self):
+        """
+        Run the query
+
+        :return: data frame
+        """
+        reader = self.reader
+        if reader.excel_file_name is not None:
+            # excel sheets can not be read in chunks
+            data = reader.get_file_content(self.view)
+            columns = self.select_columns(list(data.columns))
+            if "timestamp" in data.columns:
+                columns = ["timestamp"] + columns
+            return self.slice(data[columns])
+
+        # None when the view is read from the zip archive
+        filename = reader.view_file(self.view)
+
+        with reader.open_view(self.view) as fd:
+            header = fd.readline().decode("utf-8-sig")
+            header = next(csv.reader([header]))
+        usecols = [header[0]] + self.select_columns(header[1:])
+        if "timestamp" in header:
+            usecols.insert(1, "timestamp")
+
+        offset, origin = 0, None
+        if reader.use_time_index and "timestamp" in header and \
+                self._start is not None and filename is not None and \
+                get_compression(filename) is None:
+            index = EMONTimestampIndex(filename, self.timestamp_format)
+            if not index.load():
+                index.build()
+            origin = index.origin
+            if origin is not None:  # None when no timestamp parses
+                offset = index.seek(self._to_time(self._start, origin))
+
+        options = dict(index_col=0, sep=",", usecols=usecols,
+                       keep_default_na=False, na_values=[""], engine="c",
+                       chunksize=self.chunk_size)
+        if offset > 0:
+            # jump over the samples before the window, header is skipped too
+            options.update(header=None, names=header)
+
+        chunks = []
+        with reader.open_view(self.view) as fd:
+            if offset > 0:
+                fd.seek(offset)
+            for chunk in pd.read_csv(fd, **options):
+                if "timestamp" not in chunk.columns:
+                    chunks.append(chunk)
+                    continue
+
+                ts = pd.to_datetime(chunk["timestamp"], errors="coerce",
+                                    format=self.timestamp_format)
+                if origin is None:
+                    origin = ts.iloc[0]
+                start = self._to_time(self._start, origin)
+                end = self._to_time(self._end, origin)
+
+                mask = ts.notna()
+                if start is not None:
+                    mask &= ts >= start
+                if end is not None:
+                    mask &= ts <= end
+                chunks.append(chunk[mask.values])
+
+                if end is not None and ts.max() > end:
+                    break  # samples are in time order
+
+        if len(chunks) == 0:
+            return pd.DataFrame(columns=usecols[1:])
+
+        data = reader.format_data(pd.concat(chunks), reader.float_dtype,
+                                  reader.parse_timestamp,
+                                  reader.categorical_index)
+        return reader.filter(data)
+
+    def slice(self, data):
+        """
+        Apply the time window on a loaded data frame
+
+        :param data: data frame
+        :return: data frame
+        """
+        if "timestamp" not in data.columns or \
+                (self._start is None and self._end is None):
+            return data
+
+        ts = pd.to_datetime(data["timestamp"], errors="coerce",
+                            format=self.timestamp_format)
+        origin = ts.dropna().iloc[0] if ts.notna().any() else None
+        mask = ts.notna()
+        start = self._to_time(self._start, origin)
+        end = self._to_time(self._end, origin)
+        if start is not None:
+            mask &= ts >= start
+        if end is not None:
+            mask &= ts <= end
+        return data[mask.values]
+
+
+class TMANode(object):
+    """
+    A metric of the TMA hierarchy
+    """
+
+    def __init__(self, name, level, position, parent=None):
+        """
+        :param name: str lower case metric name
+        :param level: int
+        :param position: int row number in the data
+        :param parent: TMANode | None
+        """
+        self.name = name
+        self.level = level
+        self.position = position
+        self.parent = parent
+        self.children = []
+        self.end = position + 1  # rows [position, end) are the sub tree
+
+        self.path = (name,) if parent is None else parent.path + (name,)
+
+    @property
+    def is_leaf(self):
+        return len(self.children) == 0
+
+    def __repr__(self):
+        return "TMANode(%s, level=%s)" % (self.name, self.level)
+
+
+class TMATree(object):
+    """
+    Parent / child tree of TMA metrics, built in one pass over the metric
+    names. Metrics are listed depth first in EDP output, so the sub tree
+    of a node is a continuous range of rows.
+    """
+
+    def __init__(self, names, name_to_level):
+        """
+        :param names: iterable [str] metric names in data order
+        :param name_to_level: executable, convert a name to its level
+        """
+        self.nodes = {}  # {name: TMANode}
+        self.order = []  # [TMANode] by row position
+        self.roots = []
+
+        stack = []
+        for position, name in enumerate(names):
+            level = name_to_level(name)
+            while stack and stack[-1].level >= level:
+                stack.pop()
+
+            parent = stack[-1] if stack else None
+            node = TMANode(name, level, position, parent)
+            if parent is None:
+                self.roots.append(node)
+            else:
+                parent.children.append(node)
+
+            for ancestor in stack:
+                ancestor.end = position + 1
+            stack.append(node)
+            self.nodes[name] = node
+            self.order.append(node)
+
+    def __getitem__(self, name):
+        return self.nodes[name]
+
+    def __contains__(self, name):
+        return name in self.nodes
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def descendants(self, node):
+        """
+        :param node: TMANode
+        :return: list [TMANode] the sub tree below node, depth first
+        """
+        return self.order[node.position + 1:node.end]
+
+    def traverse(self, order="pre"):
+        """
+        Walk the whole tree
+
+        :param order: str "pre" | "post" depth first, "bfs" level by level
+        :return: iterator [TMANode]
+        """
+        if order == "bfs":
+            queue = list(self.roots)
+            for node in queue:
+                yield node
+                queue.extend(node.children)
+            return
+
+        stack = [(node, False) for node in reversed(self.roots)]
+        while stack:
+            node, visited = stack.pop()
+            if order == "post" and not visited:
+                stack.append((node, True))
+                stack.extend((c, False) for c in reversed(node.children))
+                continue
+
+            yield node
+            if order != "post":
+                stack.extend((c, False) for c in reversed(node.children))
+
 
 class TopDownHelper(object):
     data = None
+    tree = None
 
-    def __init__(self, dataframe, prefix="metric_tmam"):
+    def __init__(self, dataframe, prefix="metric_tmam",
+                 name_to_level=lambda a: a.count(".")):
         """
         :param dataframe: EMONSummaryView df
         :param prefix: str define TMAM metrics's prefix or name convention
+        :param name_to_level: executable, function what may convert to level
         """
-        # mix cases
+        # mix cases, only top-down related metrics are renamed
         prefix = prefix.lower()
 
-        name_map = {k: k.lower() for k in dataframe.index}
-        self.data = dataframe.rename(name_map, axis="index")
+        names = dataframe.index.str.lower()
+        self.data = dataframe[names.str.startswith(prefix)]
+        self.data.index = names[names.str.startswith(prefix)]
 
-        # process out top-down related metrics
-        keys = filter(lambda a: a.startswith(prefix), self.data.index)
-        self.data = self.filter(keys)
+        self.name_to_level = name_to_level
+        self.tree = TMATree(self.data.index, name_to_level)
+        self._trees = {name_to_level: self.tree}
+
+    def get_tree(self, name_to_level=None):
+        """
+        :param name_to_level: executable, None for the one of constructor
+        :return: TMATree, built once per level function
+        """
+        if name_to_level is None:
+            return self.tree
+
+        if name_to_level not in self._trees:
+            self._trees[name_to_level] = TMATree(self.data.index,
+                                                 name_to_level)
+        return self._trees[name_to_level]
+
+    def rows(self, nodes):
+        """
+        :param nodes: iterable [TMANode]
+        :return: df rows of nodes, in data order
+        """
+        return self.data.iloc[sorted(node.position for node in nodes)]
 
     def filter(self, index_list):
         """
@@ -249,43 +1327,91 @@ class TopDownHelper(object):
         """
         if isinstance(index_list, dict):
             index_list = {k.lower(): v for k, v in index_list.items()}
-            data = self.data[self.data.index.isin(index_list.keys())]
-            data = data.rename(index_list, axis='index')
         else:
             index_list = [i.lower() for i in index_list]
-            data = self.data[self.data.index.isin(index_list)]
+
+        data = self.rows(self.tree[k] for k in index_list if k in self.tree)
+        if isinstance(index_list, dict):
+            data = data.rename(index_list, axis='index')
 
         return data
 
-    def get_child(self, metric_name, name_to_level=lambda a: a.count(".")):
+    def get_node(self, metric_name):
         """
-        get all childs from parent name
+        :param metric_name: str
+        :return: TMANode | None
+        """
+        return self.tree.nodes.get(metric_name.lower())
+
+    def get_child(self, metric_name, name_to_level=None):
+        """
+        get all childs from parent name, the whole sub tree below it
 
         :param metric_name: str, parent name
         :param name_to_level: executable, function what may convert to level
         :return: df
         """
-        metric_name = metric_name.lower()
+        return self.get_descendants(metric_name, name_to_level)
 
-        start, end, level = -1, -1, -1
-        for offset, value in enumerate(self.data.index):
-            if value == metric_name:
-                start = offset + 1
-                level = name_to_level(value)
-                continue
+    def get_descendants(self, metric_name, name_to_level=None):
+        """
+        :param metric_name: str
+        :param name_to_level: executable, function what may convert to level
+        :return: df | None when metric is unknown
+        """
+        node = self.get_tree(name_to_level).nodes.get(metric_name.lower())
+        if node is None:
+            return None
+        return self.data.iloc[node.position + 1:node.end]
 
-            if start != -1 and level == name_to_level(value):
-                end = offset - 1
-                break
+    def get_children(self, metric_name):
+        """
+        :param metric_name: str
+        :return: df direct children only | None when metric is unknown
+        """
+        node = self.get_node(metric_name)
+        if node is None:
+            return None
+        return self.rows(node.children)
+
+    def get_siblings(self, metric_name):
+        """
+        :param metric_name: str
+        :return: df metrics of the same parent | None when unknown
+        """
+        node = self.get_node(metric_name)
+        if node is None:
+            return None
 
-        if start == -1:
+        family = self.tree.roots if node.parent is None \
+            else node.parent.children
+        return self.rows(i for i in family if i is not node)
+
+    def get_leaves(self, metric_name=None):
+        """
+        :param metric_name: str, None for the whole tree
+        :return: df leaf metrics below metric_name | None when unknown
+        """
+        if metric_name is None:
+            return self.rows(i for i in self.tree.order if i.is_leaf)
+
+        node = self.get_node(metric_name)
+        if node is None:
             return None
+        return self.rows(i for i in self.tree.descendants(node) if i.is_leaf)
 
-        return self.data[start:end]
+    def traverse(self, order="pre"):
+        """
+        :param order: str "pre" | "post" | "bfs"
+        :return: iterator [(TMANode, value)]
+        """
+        for node in self.tree.traverse(order):
+            yield node, self.data.iloc[node.position]
 
 
 class EMONMetricFormula:
     Body = None
+    _tree = None
 
     def __init__(self, metric):
         self.Body = metric
@@ -300,6 +1426,19 @@ class EMONMetricFormula:
             if element.tag == "formula":
                 return element.text
 
+    @property
+    def tree(self):
+        """
+        Parsed formula, built once per formula object
+
+        :return: tuple formula tree, see FormulaParser
+        """
+        if self._tree is None:
+            if self.formula is None:
+                raise EMONDataError("%s has no formula" % self.name)
+            self._tree = FormulaParser(self.formula).parse()
+        return self._tree
+
     def get_required_event(self):
         event = []
         for element in self.Body:
@@ -314,23 +1453,46 @@ class EMONMetricFormula:
                 event.append(element.text)
         return event
 
-    def get_formula_body(self):
-
-        convert = {}
+    def get_aliases(self):
+        """
+        :return: dict {alias: (tag, text)}, tag is "event" or "constant"
+        """
+        aliases = {}
         for element in self.Body:
             if element.tag in ("constant", "event"):
-                convert[element.attrib['alias']] = element.text
-            else:
-                continue
+                aliases[element.attrib["alias"]] = (element.tag,
+                                                    element.text.strip())
+        return aliases
+
+    def get_formula_body(self):
+        """
+        Formula with aliases replaced by event and constant names, the
+        original spacing and parentheses are kept.
 
+        :return: str
+        """
         formula = self.formula
-        for char in convert.keys():
-            formula = formula.replace(char, "{{%s}}" % char)
+        if formula is None:
+            return ""
+
+        convert = {k: v for k, (_, v) in self.get_aliases().items()}
 
-        for char in convert.keys():
-            formula = formula.replace("{{%s}}" % char, convert[char])
+        try:
+            tokens = FormulaParser.tokenize(formula)
+        except EMONFormulaError:
+            return formula
 
-        return formula
+        body, pos = [], 0
+        for token in tokens:
+            body.append(formula[pos:token.start])
+            if token.kind == "name":
+                body.append(convert.get(token.text, token.text))
+            else:
+                body.append(token.text)
+            pos = token.end
+        body.append(formula[pos:])
+
+        return "".join(body)
 
     def __str__(self):
         return "%s = %s" % (self.name, self.get_formula_body())
@@ -339,13 +1501,44 @@ class EMONMetricFormula:
 class EMONMetricFormulaReader:
     filename = None
 
+    # {abs filename: (mtime, [EMONMetricFormula])} shared by all readers
+    _formula_sets = {}
+
     def __init__(self, filename):
         self.filename = filename
 
+    def get_formulas(self):
+        """
+        Parsed formulas of the xml file, cached until the file changes
+
+        :return: list [EMONMetricFormula]
+        """
+        path = os.path.abspath(self.filename)
+        mtime = os.stat(path).st_mtime_ns
+
+        cached = self._formula_sets.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        file_content = ET.ElementTree(file=path)
+        formulas = [EMONMetricFormula(metric)
+                    for metric in file_content.getroot()]
+        self._formula_sets[path] = (mtime, formulas)
+        return formulas
+
     def __iter__(self):
-        file_content = ET.ElementTree(file=self.filename)
-        for metric in file_content.getroot():
-            yield EMONMetricFormula(metric)
+        return iter(self.get_formulas())
+
+    def dependency_graph(self):
+        """
+        Build the dependency graph of all formulas, shared events and sub
+        expressions are evaluated once.
+
+        :return: EMONFormulaGraph
+        """
+        # imported here, emon_metrics depends on this module
+        from .emon_metrics import EMONFormulaGraph
+        return EMONFormulaGraph(self)
 
 
 EDPFormulas = EMONMetricFormulaReader
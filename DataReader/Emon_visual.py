@@ -373,10 +373,8 @@ class MetricsDiagrams:
         self.path = path
         reader = EMONDetailData(path)
         data = reader.get_file_content(view)
-        for m in data.columns.values:
-            if not m.startswith("metric_"):
-                del (data[m])
-        self.data = data
+        columns = [m for m in data.columns.values if m.startswith("metric_")]
+        self.data = data[columns]
 
     def select_data(self, metric):
         heads = {}
@@ -17,14 +17,32 @@ class BaseSPECcpuScore(RawDataFileReader):
         if component is not None:
             self.set_component(component)
 
-    def set_component(self, component):
-        component = component.lower()
+    @staticmethod
+    def component_regex(component):
         # full component format
-        regex = r"^\d{3}\.%s+.?(\s+\d+){3}" % component
+        return r"^\d{3}\.%s+.?(\s+\d+){3}" % component.lower()
+
+    @staticmethod
+    def split_score_row(score_content):
+        return list(filter(lambda a: len(a) > 0, score_content.split()))
+
+    def set_component(self, component):
+        regex = self.component_regex(component)
         for score_content in self.grep_iterator(regex):
             break
-        self.score_row = list(
-            filter(lambda a: len(a) > 0, score_content.split()))
+        self.score_row = self.split_score_row(score_content)
+
+    def get_rates(self, components):
+        """
+        Get rates of many components with one scan of the file
+
+        :param components: list [str]
+        :return: dict {str: float}
+        """
+        rows = self.batch_grep({c: self.component_regex(c)
+                                for c in components})
+        return {c: float(self.split_score_row(rows[c][0])[3])
+                for c in components if len(rows[c]) > 0}
 
     @property
     def rate(self):
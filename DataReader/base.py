@@ -1,12 +1,87 @@
+import csv
+import io
 import os
 import re
 import sys
+import warnings
 
 import pandas as pd
 
+from .cache_manager import cache_manager, get_cache_size
+from .compression import get_compression, open_file
+from .disk_cache import DiskCache
+from .line_index import LineOffsetIndex
+
 __all__ = ["RawDataFileReader", "DataCacheObject", "DataReaderError",
            "LinuxColumnStyleOutputReader"]
 
+_REGEX_META = set(".^$*+?{}[]\\|()")
+
+# groupby reductions which can be merged from partial results
+STREAM_SUMMARIES = ("mean", "sum", "count", "max", "min")
+
+
+def _literal_prefix(regex):
+    """
+    Get the plain text every match of regex has to start with. No prefix is
+    given for patterns with a top-level alternation or a group, or which
+    start with a meta character.
+
+    >>> _literal_prefix("procs.*")
+    ('procs', False)
+    >>> _literal_prefix("foo|bar")
+    ('', False)
+    >>> _literal_prefix("(?i)cpu")
+    ('', False)
+    >>> _literal_prefix("Average:")
+    ('Average:', True)
+
+    :param regex: str regex string
+    :return: (str, bool) prefix, whether the whole regex is plain text
+    """
+    if regex.startswith("^"):
+        regex = regex[1:]
+
+    if "(" in regex.replace("\\(", "") or _has_alternation(regex):
+        return "", False
+
+    for offset, char in enumerate(regex):
+        if char in _REGEX_META:
+            prefix = regex[:offset]
+            if char in "*?{":  # the last char is optional/repeated
+                prefix = prefix[:-1]
+            return prefix, False
+
+    return regex, True
+
+
+def _has_alternation(regex):
+    """
+    :param regex: str regex string without groups
+    :return: bool, True when "|" is outside of escapes and character sets
+    """
+    escaped, in_set = False, False
+    for char in regex:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif in_set:
+            in_set = char != "]"
+        elif char == "[":
+            in_set = True
+        elif char == "|":
+            return True
+    return False
+
+
+def _type_name(dtype):
+    """
+    :param dtype: type or str
+    :return: str stable name of dtype for the disk cache identity
+    """
+    return getattr(dtype, "__name__", str(dtype))
+
 
 class RawDataFileReader(object):
     """
@@ -18,20 +93,60 @@ class RawDataFileReader(object):
     # build up a cache object to accelerate the file access
     _raw_data_cache = None
 
+    # memory map files instead of reading them into a list of lines,
+    # None: only for files larger than mmap_threshold
+    use_mmap = None
+    mmap_threshold = 256 * 2 ** 20
+
+    def is_mapped(self):
+        """
+        Whether the raw data file is served by a memory-mapped line index
+
+        :return: bool
+        """
+        if self.compression is not None:
+            return False  # only plain files could be mapped
+
+        if self.use_mmap is None:
+            return self.file_size >= self.mmap_threshold
+        return self.use_mmap
+
+    @property
+    def compression(self):
+        """
+        Compression format of the raw data file, None for plain text
+
+        :return: str | None
+        """
+        return get_compression(self.filename)
+
     def reader(self, cache_refresh=False):
         """
-        main method to read raw data files.
+        main method to read raw data files, gzip, bz2, xz and zstd
+        compressed files are decompressed on the fly.
 
         :param cache_refresh: mandatory refresh the cached file
-        :return: list
+        :return: list | LineOffsetIndex
         """
         if cache_refresh or self._raw_data_cache is None:
             if not os.path.exists(self.filename):
                 raise DataReaderError(
                     "Raw data file %s is not exist" % self.filename)
-            with open(self.filename, "r") as fd:
-                self._raw_data_cache = fd.readlines()
 
+            if isinstance(self._raw_data_cache, LineOffsetIndex):
+                self._raw_data_cache.close()
+
+            if self.is_mapped():
+                self._raw_data_cache = LineOffsetIndex(self.filename)
+            else:
+                with open_file(self.filename, "r") as fd:
+                    self._raw_data_cache = fd.readlines()
+
+            cache = self._raw_data_cache
+            cache_manager.register(self, "_raw_data_cache", cache)
+            return cache
+
+        cache_manager.hit(self, "_raw_data_cache")
         return self._raw_data_cache
 
     def grep(self, key_word):
@@ -41,7 +156,11 @@ class RawDataFileReader(object):
         :return: list
         """
         # return self.egrep(key_word)
-        return filter(lambda a: a.find(key_word) != -1, self.reader())
+        content = self.reader()
+        if isinstance(content, LineOffsetIndex):
+            return content.grep(key_word)
+
+        return filter(lambda a: a.find(key_word) != -1, content)
 
     def egrep(self, regex):
         """
@@ -49,7 +168,88 @@ class RawDataFileReader(object):
         :param regex: regex string
         :return: list
         """
-        return filter(lambda a: re.match(regex, a), self.reader())
+        content = self.reader()
+        if isinstance(content, LineOffsetIndex):
+            return content.egrep(regex)
+
+        return filter(lambda a: re.match(regex, a), content)
+
+    def batch_grep(self, patterns, regex=True):
+        """
+        Run many grep/egrep at once, the file is scanned only one time.
+
+        Regex patterns are matched from the start of the line as egrep does,
+        and combined into a single compiled regex. Patterns with groups or
+        inline flags could not be embedded, they are matched one by one.
+        Lines not starting with the literal prefix of any pattern are skipped
+        without regex matching.
+
+        :param patterns: dict {str: str} named patterns
+        :param regex: bool, False to search plain key words as grep does
+        :return: dict {str: [str]} matched lines per pattern name
+        """
+        result = {name: [] for name in patterns}
+        if len(patterns) == 0:
+            return result
+
+        if not regex:
+            key_words = list(patterns.items())
+            for row in self.reader():
+                for name, key_word in key_words:
+                    if row.find(key_word) != -1:
+                        result[name].append(row)
+            return result
+
+        prefixes, literals, groups, separate = [], [], {}, []
+        plain_flags = re.compile("").flags
+        for offset, (name, pattern) in enumerate(patterns.items()):
+            prefix, is_literal = _literal_prefix(pattern)
+            prefixes.append(prefix)
+            if is_literal:
+                literals.append((name, prefix))
+                continue
+
+            compiled = re.compile(pattern)
+            if compiled.groups > 0 or compiled.flags != plain_flags:
+                # back references and global flags break the combined regex
+                separate.append((name, compiled))
+            else:
+                groups["_batch%s" % offset] = name, pattern
+
+        # every pattern is an optional look ahead, so one match call reports
+        # all patterns of the line
+        combined = "".join(["(?:(?=(?P<%s>%s))|)" % (group, pattern)
+                            for group, (_, pattern) in groups.items()])
+        try:
+            combined = re.compile(combined)
+        except re.error:
+            separate += [(name, re.compile(pattern))
+                         for name, pattern in groups.values()]
+            groups = {}
+
+        prefixes = tuple(prefixes)
+        fast_path = "" not in prefixes
+
+        for row in self.reader():
+            if fast_path and not row.startswith(prefixes):
+                continue
+
+            for name, prefix in literals:
+                if row.startswith(prefix):
+                    result[name].append(row)
+
+            for name, compiled in separate:
+                if compiled.match(row):
+                    result[name].append(row)
+
+            if len(groups) == 0:
+                continue
+
+            for group, value in combined.match(row).groupdict().items():
+                if value is not None:
+                    result[groups[group][0]].append(row)
+
+        return result
 
     def grep_iterator(self, regex):
         """
@@ -57,9 +257,16 @@ class RawDataFileReader(object):
         :param regex: regex string
         :return: iterator
         """
+        if self.is_mapped():
+            content = self.reader()
+            if isinstance(content, LineOffsetIndex):
+                for row in content.egrep(regex):
+                    yield row
+                return
+
         regex = re.compile(regex)
         # for row in self.reader():
-        with open(self.filename, "r") as fd:
+        with open_file(self.filename, "r") as fd:
             while True:
                 row = fd.readline()
                 if len(row) == 0:
@@ -68,9 +275,60 @@ class RawDataFileReader(object):
                 if regex.match(row):
                     yield row
 
+    # follow mode state: first byte not consumed yet, unfinished last line
+    _follow_offset = 0
+    _follow_partial = b""
+    _follow_start = 0  # offset the last follow() read from, 0 on restart
+
+    def follow(self):
+        """
+        Read lines appended to the file since the last call, for files still
+        being written. The first call returns all complete lines, a trailing
+        line without new line is kept back until it is finished.
+
+        The cached raw data is extended in place when it is a list of lines.
+
+        :return: list [str] new lines
+        """
+        if self.compression is not None:
+            raise DataReaderError(
+                "Can not follow compressed file %s" % self.filename)
+
+        start = self._follow_offset
+        if self.file_size < start:  # truncated or rotated, restart
+            start, self._follow_partial = 0, b""
+
+        self._follow_start = start
+        with open(self.filename, "rb") as fd:
+            fd.seek(start)
+            chunk = self._follow_partial + fd.read()
+            self._follow_offset = fd.tell()
+
+        lines = chunk.split(b"\n")
+        self._follow_partial = lines.pop()
+        lines = [i.decode("utf-8", errors="replace") + "\n" for i in lines]
+
+        cache = self._raw_data_cache
+        if start == 0:
+            if isinstance(cache, list):
+                self._raw_data_cache = list(lines)
+                cache_manager.resize(self, "_raw_data_cache")
+        elif isinstance(cache, list):
+            before = sys.getsizeof(cache)
+            cache.extend(lines)
+            cache_manager.grow(self, "_raw_data_cache",
+                               sys.getsizeof(cache) - before +
+                               sum(sys.getsizeof(i) for i in lines))
+        elif isinstance(cache, LineOffsetIndex):
+            self._raw_data_cache = None  # re-index on next access
+
+        return lines
+
     def read_line(self, start, end=0):
         """
-        Get content from row number
+        Get content from row number, mapped files only decode the rows
+        in range.
+
         :param start: int
         :param end: int
         :return: iterator
@@ -102,6 +360,9 @@ class DataCacheObject:
     _data_cache = None  # the cache object with dict
     header = []
 
+    # folder to keep parsed data frames across runs, None to disable
+    disk_cache_path = None
+
     def get_content(self):
         """
         main function to get real data, must be overrode by child!!!
@@ -119,10 +380,60 @@ class DataCacheObject:
         :return: Data object
         """
         if self._data_cache is None:
-            self._data_cache = self.get_content()
+            if self.disk_cache_path is None:
+                self._data_cache = self.get_content()
+            else:
+                self._data_cache = self.get_disk_cached_content()
+
+            cache = self._data_cache
+            cache_manager.register(self, "_data_cache", cache)
+            return cache
 
+        cache_manager.hit(self, "_data_cache")
         return self._data_cache
 
+    def source_files(self):
+        """
+        Files the content is parsed from, used to validate the disk cache.
+        May override by child objects.
+
+        :return: list [str]
+        """
+        return [self.filename]
+
+    def cache_params(self):
+        """
+        Reader options which change the parsed content, they are a part of
+        the disk cache identity. May override by child objects.
+
+        :return: object json serializable
+        """
+        return None
+
+    def get_disk_cached_content(self):
+        """
+        Load the data frame from disk cache, or parse and save it.
+
+        :return: data object
+        """
+        cls = type(self)
+        files = self.source_files()
+        key = "%s.%s:%s" % (cls.__module__, cls.__qualname__,
+                            ",".join(os.path.abspath(f) for f in files))
+        identity = {"files": DiskCache.file_identity(files),
+                    "version": str(getattr(cls, "__version__", "")),
+                    "pandas": pd.__version__,
+                    "params": self.cache_params()}
+
+        cache = DiskCache(self.disk_cache_path)
+        data = cache.load(key, identity)
+        if data is None:
+            data = self.get_content()
+            if isinstance(data, pd.DataFrame):
+                cache.dump(key, identity, data)
+
+        return data
+
     def __getitem__(self, item):
         if item not in self.header:
             return None
@@ -156,7 +467,22 @@ class LinuxColumnStyleOutputReader(RawDataFileReader, DataCacheObject):
         if column_name_list is not None:
             self.header = column_name_list
 
+    def cache_params(self):
+        schema = self.schema or {}
+        return {"header": [str(col) for col in self.header],
+                "schema": {str(k): _type_name(v) for k, v in schema.items()},
+                "dtype": _type_name(self.dtype),
+                "data_row_regex": self.data_row_regex}
+
     dtype = float
+    schema = None  # {column: dtype} types of dedicate columns
+
+    # parse matched lines with the pandas C parser in one call
+    vectorized = True
+
+    # files larger than it are reduced chunk by chunk, None to disable
+    stream_threshold = 512 * 2 ** 20
+    chunk_rows = 100000
 
     def get_content(self):
         """
@@ -164,10 +490,133 @@ class LinuxColumnStyleOutputReader(RawDataFileReader, DataCacheObject):
 
         :return: pandas data table
         """
+        if self.is_vectorized() and not self.is_mapped():
+            regex = re.compile(self.data_row_regex)
+            with open_file(self.filename, "r") as fd:
+                rows = list(filter(regex.match, fd))
+        else:
+            rows = self.grep_iterator(self.data_row_regex)
+
+        return self.parse_rows(rows)
+
+    def parse_rows(self, rows):
+        """
+        Build up a pandas data frame from data lines
+
+        :param rows: iterator [str] lines matched data_row_regex
+        :return: pandas data table
+        """
+        if self.is_vectorized():
+            rows = list(rows)
+            try:
+                return self.parse_rows_vectorized(rows)
+            except pd.errors.ParserError:
+                pass  # irregular rows, fallback to the row by row parser
+
         data = []
-        for row in self.grep_iterator(self.data_row_regex):
+        for row in rows:
             data.append(self.data_formatter(row))
-        df = pd.DataFrame(data, columns=self.header, dtype=self.dtype)
+        df = pd.DataFrame(data, columns=self.header)
+
+        return self.apply_schema(df)
+
+    def follow_data(self):
+        """
+        Parse only the rows appended since the last call and append them to
+        the cached data frame, for files still being written.
+
+        :return: pandas data table, the new rows
+        """
+        if self._data_cache is None and self._follow_offset != 0:
+            # cache was dropped, rebuild from the beginning
+            self._follow_offset, self._follow_partial = 0, b""
+
+        regex = re.compile(self.data_row_regex)
+        df = self.parse_rows(filter(regex.match, self.follow()))
+
+        # follow() restarts from 0 when the file was truncated or rotated
+        if self._follow_start == 0 or self._data_cache is None:
+            self._data_cache = df
+            cache_manager.register(self, "_data_cache", df)
+        elif len(df) > 0:
+            self._data_cache = pd.concat([self._data_cache, df],
+                                         ignore_index=True)
+            cache_manager.grow(self, "_data_cache", get_cache_size(df))
+
+        return df
+
+    def is_vectorized(self):
+        """
+        The C parser skips data_formatter, so it is used only when the child
+        keeps the default one or moves its logic into frame_formatter.
+
+        :return: bool
+        """
+        if not self.vectorized:
+            return False
+
+        cls, base = type(self), LinuxColumnStyleOutputReader
+        return cls.data_formatter is base.data_formatter or \
+            cls.frame_formatter is not base.frame_formatter
+
+    def parse_rows_vectorized(self, rows):
+        """
+        Parse data lines with one read_csv call
+
+        :param rows: list [str]
+        :return: pandas data table
+        """
+        content = "".join(rows)
+        options = dict(sep=r"\s+", header=None, names=self.header,
+                       index_col=False, engine="c", quoting=csv.QUOTE_NONE)
+        with warnings.catch_warnings():
+            # rows longer than header are cut with a warning, don't drop
+            # data but let the row by row parser raise
+            warnings.simplefilter("error", pd.errors.ParserWarning)
+            try:
+                df = self._read_rows(content, options)
+            except pd.errors.ParserWarning as e:
+                raise pd.errors.ParserError(str(e))
+
+        df = self.frame_formatter(df)
+        return self.apply_schema(df)
+
+    def _read_rows(self, content, options):
+        try:
+            return pd.read_csv(io.StringIO(content), dtype=self.get_schema(),
+                               **options)
+        except pd.errors.ParserError:
+            raise
+        except ValueError:
+            # e.g. missing values in integer columns, cast them later
+            return pd.read_csv(io.StringIO(content), **options)
+
+    def get_schema(self):
+        """
+        Column types of the data table, columns not in schema use dtype
+
+        :return: dict {str: dtype}
+        """
+        if self.schema is None:
+            return {}
+        return {k: v for k, v in self.schema.items() if k in self.header}
+
+    def apply_schema(self, df):
+        """
+        Cast columns to the types from schema, or to dtype by default
+
+        :param df: pandas data table
+        :return: pandas data table
+        """
+        schema = self.get_schema()
+        for col in df.columns:
+            dtype = schema.get(col, self.dtype)
+            if df[col].dtype == dtype:
+                continue
+            try:
+                df[col] = df[col].astype(dtype)
+            except (ValueError, TypeError):
+                pass  # keep label columns as they are
 
         return df
 
@@ -180,6 +629,16 @@ class LinuxColumnStyleOutputReader(RawDataFileReader, DataCacheObject):
         """
         return row.split()
 
+    def frame_formatter(self, df):
+        """
+        Vectorized formatter for the parsed data table, it is the
+        replacement of data_formatter when the C parser is used.
+
+        :param df: pandas data table
+        :return: pandas data table
+        """
+        return df
+
     def distinct(self, column):
         """
         Get distinct values from column gaven
@@ -187,8 +646,152 @@ class LinuxColumnStyleOutputReader(RawDataFileReader, DataCacheObject):
         :param column: str column name
         :return: list [str]
         """
+        if self.is_streaming():
+            return self.stream_distinct(column)
+
         return list(self.data[column].drop_duplicates())
 
+    def is_streaming(self):
+        """
+        Whether reductions should run chunk by chunk instead of on the
+        whole data frame.
+
+        :return: bool
+        """
+        if self._data_cache is not None or self.stream_threshold is None:
+            return False
+        return self.file_size >= self.stream_threshold
+
+    def iter_chunks(self, rows=None):
+        """
+        Parse the data file as data frames of bounded size
+
+        :param rows: int max rows per chunk
+        :return: iterator [pandas data table]
+        """
+        if rows is None:
+            rows = self.chunk_rows
+
+        offset, buffer = 0, []
+        for row in self.grep_iterator(self.data_row_regex):
+            buffer.append(row)
+            if len(buffer) < rows:
+                continue
+
+            chunk = self.parse_rows(buffer)
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            buffer = []
+            yield chunk
+
+        if len(buffer) > 0:
+            chunk = self.parse_rows(buffer)
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            yield chunk
+
+    def stream_distinct(self, column, rows=None):
+        """
+        Distinct values of column, computed chunk by chunk
+
+        :param column: str column name
+        :param rows: int max rows per chunk
+        :return: list
+        """
+        values = {}
+        for chunk in self.iter_chunks(rows):
+            values.update(dict.fromkeys(chunk[column].drop_duplicates()))
+        return list(values.keys())
+
+    def group_aggregate(self, column, summary="mean"):
+        """
+        Group by column and reduce the other columns, chunk by chunk for
+        large files when summary supports it.
+
+        :param column: str column name to group by
+        :param summary: str name of a pandas groupby reduction
+        :return: pandas data table
+        """
+        if summary in STREAM_SUMMARIES and self.is_streaming():
+            return self.stream_aggregate(column, summary)
+
+        return getattr(self.data.groupby(column), summary)()
+
+    def stream_aggregate(self, column, summary="mean", rows=None):
+        """
+        Group by column and reduce the other columns chunk by chunk, memory
+        usage depends on the number of groups only. The result equals the
+        groupby reduction of the whole data frame.
+
+        :param column: str column name to group by
+        :param summary: str mean | sum | count | max | min
+        :param rows: int max rows per chunk
+        :return: pandas data table
+        """
+        if summary not in STREAM_SUMMARIES:
+            raise DataReaderError(
+                "summary %s can not be computed chunk by chunk" % summary)
+
+        total, count, dtypes, categorical = None, None, None, False
+        for chunk in self.iter_chunks(rows):
+            values = chunk.drop(columns=column)
+            key = chunk[column]
+            if isinstance(key.dtype, pd.CategoricalDtype):
+                # categories differ between chunks, group by plain values
+                key = key.astype(key.cat.categories.dtype)
+                categorical = True
+            if dtypes is None:
+                dtypes = values.dtypes
+
+            if summary == "mean":
+                # sum up time stamps as integers
+                for col in values.select_dtypes("datetime").columns:
+                    values[col] = values[col].astype("int64")
+            grouped = values.groupby(key)
+
+            if summary in ("mean", "sum"):
+                part = grouped.sum()
+            elif summary == "count":
+                part = grouped.count()
+            else:
+                part = getattr(grouped, summary)()
+
+            if total is None:
+                total = part
+            elif summary in ("max", "min"):
+                total = getattr(pd.concat([total, part]).groupby(level=0),
+                                summary)()
+            else:
+                total = total.add(part, fill_value=0)
+
+            if summary == "mean":
+                part = grouped.count()
+                count = part if count is None else count.add(part,
+                                                             fill_value=0)
+
+        if total is None:
+            return pd.DataFrame()
+
+        if summary == "mean":
+            total = total / count
+        total = total.sort_index()
+
+        # restore the column types of the in memory reduction
+        for col, dtype in dtypes.items():
+            if summary == "count":
+                dtype = "int64"
+            elif summary == "mean" \
+                    and pd.api.types.is_datetime64_dtype(dtype):
+                total[col] = total[col].round().astype("int64")
+            elif summary in ("mean", "sum") \
+                    and not pd.api.types.is_float_dtype(dtype):
+                dtype = "float64" if summary == "mean" else "int64"
+            total[col] = total[col].astype(dtype)
+
+        if categorical:
+            total.index = pd.CategoricalIndex(total.index)
+        total.index.name = column
+        return total
+
     def row_filter(self, column_name, target, keep_column=False):
         """
         filter out entries which col = target
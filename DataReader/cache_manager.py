@@ -0,0 +1,197 @@
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
+
+__all__ = ["CacheManager", "cache_manager"]
+
+
+def get_cache_size(value):
+    """
+    Estimate the memory footprint of a cached object
+
+    :param value: object list of lines, data frame, line index ...
+    :return: int bytes
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            get_cache_size(i) for i in value.values())
+
+    if isinstance(value, list):
+        return sys.getsizeof(value) + sum(sys.getsizeof(i) for i in value)
+
+    offsets = getattr(value, "offsets", None)  # memory-mapped line index
+    if offsets is not None:
+        return int(offsets.nbytes)
+
+    return sys.getsizeof(value)
+
+
+class CacheManager(object):
+    """
+    Process-wide registry of the caches held by reader objects.
+
+    Each entry is a cache attribute of an object. When the total size is
+    over budget, the least recently used entries are reset to None, and the
+    reader rebuilds them on next access.
+    """
+
+    def __init__(self, budget=None):
+        """
+        :param budget: int bytes, None for unlimited
+        """
+        self.budget = budget
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()  # {(id, attr): [weakref, size]}
+        self._size = 0
+        self._lock = threading.RLock()
+
+    def set_budget(self, budget):
+        """
+        :param budget: int bytes, None for unlimited
+        :return: None
+        """
+        with self._lock:
+            self.budget = budget
+            self._evict()
+
+    def hit(self, owner, attr):
+        """
+        Record an access to a cached entry, move it to the recent end
+
+        :param owner: object which holds the cache
+        :param attr: str cache attribute name
+        :return: None
+        """
+        with self._lock:
+            self.hits += 1
+            key = (id(owner), attr)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def register(self, owner, attr, value=None):
+        """
+        Record a (re)built cache entry, may evict other entries
+
+        :param owner: object which holds the cache
+        :param attr: str cache attribute name
+        :param value: object cached, read from owner when None
+        :return: None
+        """
+        if value is None:
+            value = getattr(owner, attr)
+        size = get_cache_size(value)
+        key = (id(owner), attr)
+
+        with self._lock:
+            self.misses += 1
+            self._discard(key)
+
+            ref = weakref.ref(owner, lambda _, k=key: self.discard(k))
+            self._entries[key] = [ref, size]
+            self._size += size
+            self._evict(keep=key)
+
+    def resize(self, owner, attr):
+        """
+        Update the size of an entry which grew in place
+
+        :param owner: object which holds the cache
+        :param attr: str cache attribute name
+        :return: None
+        """
+        key = (id(owner), attr)
+        with self._lock:
+            if key not in self._entries:
+                return
+            size = get_cache_size(getattr(owner, attr))
+            self._size += size - self._entries[key][1]
+            self._entries[key][1] = size
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+
+    def grow(self, owner, attr, added):
+        """
+        Add to the size of an entry which grew in place, the cost depends
+        on the added part only
+
+        :param owner: object which holds the cache
+        :param attr: str cache attribute name
+        :param added: int bytes added to the entry
+        :return: None
+        """
+        key = (id(owner), attr)
+        with self._lock:
+            if key not in self._entries:
+                return
+            self._size += added
+            self._entries[key][1] += added
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+
+    def discard(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def _evict(self, keep=None):
+        if self.budget is None:
+            return
+
+        for key in list(self._entries.keys()):
+            if self._size <= self.budget:
+                break
+            if key == keep:
+                continue
+
+            ref, _ = self._entries[key]
+            self._discard(key)
+            owner = ref()
+            if owner is not None:
+                setattr(owner, key[1], None)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drop all registered caches
+
+        :return: None
+        """
+        with self._lock:
+            for key, (ref, _) in list(self._entries.items()):
+                owner = ref()
+                if owner is not None:
+                    setattr(owner, key[1], None)
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def stats(self):
+        """
+        :return: dict
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self._size,
+                    "budget": self.budget}
+
+
+# the shared registry used by all readers
+cache_manager = CacheManager()
@@ -0,0 +1,140 @@
+import bz2
+import gzip
+import io
+import lzma
+import shutil
+import subprocess
+
+__all__ = ["open_file", "get_compression", "COMPRESSED_EXTENSIONS"]
+
+ZSTD_SUPPORT = True
+try:
+    import zstandard
+except ImportError:
+    ZSTD_SUPPORT = False
+
+# magic number at the beginning of compressed files
+MAGIC_NUMBERS = {
+    "gzip": b"\x1f\x8b",
+    "bz2": b"BZh",
+    "xz": b"\xfd7zXZ\x00",
+    "zstd": b"\x28\xb5\x2f\xfd",
+}
+
+COMPRESSED_EXTENSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz",
+                         ".zst": "zstd"}
+
+# multi-threaded command line decompressors, tried before python modules
+EXTERNAL_DECOMPRESSORS = {
+    "gzip": ["pigz", "-dc"],
+    "xz": ["xz", "-dc", "-T0"],
+    "zstd": ["zstd", "-dcq", "-T0"],
+}
+
+use_external_decompressor = True
+
+
+def get_compression(filename):
+    """
+    Detect compression format by file header
+
+    :param filename: str
+    :return: str | None
+    """
+    with open(filename, "rb") as fd:
+        head = fd.read(6)
+
+    for name, magic in MAGIC_NUMBERS.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+class PipeFile(object):
+    """
+    File object reading the stdout of a decompressor process
+    """
+
+    def __init__(self, command, filename, mode="r", encoding=None):
+        self.filename = filename
+        self._process = subprocess.Popen(command + [filename],
+                                         stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE)
+        self._fd = self._process.stdout
+        if "b" not in mode:
+            self._fd = io.TextIOWrapper(self._fd, encoding=encoding)
+
+    def close(self):
+        """
+        Close the pipe, a decompressor failure (truncated or corrupt file)
+        is raised when the output was read to the end.
+
+        :return: None
+        """
+        process = self._process
+        if process.stdout.closed:
+            return
+
+        # stdout is at its end when the decompressor closed it
+        at_eof = process.stdout.read(1) == b""
+        self._fd.close()
+        if not at_eof:
+            process.kill()  # stopped reading early
+        process.wait()
+
+        stderr = process.stderr.read().decode("utf-8", errors="replace")
+        process.stderr.close()
+        if at_eof and process.returncode != 0:
+            # imported here, base depends on this module
+            from .base import DataReaderError
+            raise DataReaderError("Failed to decompress %s: %s"
+                                  % (self.filename, stderr.strip()))
+
+    def __getattr__(self, item):
+        return getattr(self._fd, item)
+
+    def __iter__(self):
+        return iter(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def open_file(filename, mode="r", encoding=None, seekable=False):
+    """
+    Open plain or compressed (gzip, bz2, xz, zstd) files, compressed files
+    are decompressed as a stream without temporary files.
+
+    :param filename: str
+    :param mode: str "r" or "rb"
+    :param encoding: str for text mode
+    :param seekable: bool, True to avoid decompressor processes (pipes)
+    :return: file object
+    """
+    compression = get_compression(filename)
+    if compression is None:
+        return open(filename, mode, encoding=encoding)
+
+    text_mode = "b" not in mode
+    command = EXTERNAL_DECOMPRESSORS.get(compression)
+    if use_external_decompressor and not seekable and command is not None \
+            and shutil.which(command[0]) is not None:
+        return PipeFile(command, filename, mode, encoding)
+
+    if compression == "gzip":
+        fd = gzip.open(filename, "rb")
+    elif compression == "bz2":
+        fd = bz2.open(filename, "rb")
+    elif compression == "xz":
+        fd = lzma.open(filename, "rb")
+    elif ZSTD_SUPPORT:
+        fd = zstandard.open(filename, "rb")
+    else:
+        raise IOError("zstandard is required to read %s" % filename)
+
+    if text_mode:
+        fd = io.TextIOWrapper(fd, encoding=encoding)
+    return fd
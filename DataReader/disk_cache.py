@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+__all__ = ["DiskCache", "save_npz"]
+
+PARQUET_SUPPORT = True
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    PARQUET_SUPPORT = False
+
+
+def save_npz(filename, **arrays):
+    """
+    Save arrays as .npz through a temporary file next to filename, readers
+    see either the previous or the complete new file.
+
+    :param filename: str
+    :param arrays: ndarray by name
+    :return: None
+    """
+    path, name = os.path.split(os.path.abspath(filename))
+    fd, temp = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=path)
+    try:
+        with os.fdopen(fd, "wb") as output:
+            np.savez(output, **arrays)
+        os.replace(temp, filename)
+    except BaseException:
+        os.remove(temp)
+        raise
+
+
+class DiskCache(object):
+    """
+    Keep parsed data frames on disk, next to a small json file which records
+    the identity (path, size, mtime, reader class, parse options and pandas
+    version) of the source. A changed identity invalidates the entry.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: str cache folder, created on first write
+        """
+        self.path = path
+
+    @staticmethod
+    def file_identity(filenames):
+        """
+        Build up the identity of source files
+
+        :param filenames: list [str]
+        :return: list [[str, int, int]] abs filename, size, mtime
+        """
+        identity = []
+        for filename in filenames:
+            stat = os.stat(filename)
+            identity.append(
+                [os.path.abspath(filename), stat.st_size, stat.st_mtime_ns])
+        return identity
+
+    def _entry(self, key):
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, name)
+
+    def load(self, key, identity):
+        """
+        :param key: str entry name
+        :param identity: object json serializable, must equal to the stored
+        :return: data frame | None when missing or outdated
+        """
+        entry = self._entry(key)
+        try:
+            with open("%s.json" % entry, "r") as fd:
+                meta = json.load(fd)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get("identity") != identity:
+            return None
+
+        try:
+            if meta["format"] == "parquet":
+                return pd.read_parquet("%s.parquet" % entry)
+            return pd.read_pickle("%s.pkl" % entry)
+        except (OSError, ImportError, ValueError):
+            return None
+
+    def dump(self, key, identity, data_frame):
+        """
+        :param key: str entry name
+        :param identity: object json serializable
+        :param data_frame: data frame
+        :return: None
+        """
+        os.makedirs(self.path, exist_ok=True)
+        entry = self._entry(key)
+        if os.path.exists("%s.json" % entry):
+            os.remove("%s.json" % entry)
+
+        cache_format = "pickle"
+        if PARQUET_SUPPORT:
+            try:
+                data_frame.to_parquet("%s.parquet" % entry)
+                cache_format = "parquet"
+            except (ValueError, TypeError, ImportError):
+                pass  # e.g. mixed type columns, use pickle instead
+
+        if cache_format == "pickle":
+            data_frame.to_pickle("%s.pkl" % entry)
+
+        # meta data is written at the last, so a broken entry is never valid
+        with open("%s.json" % entry, "w") as fd:
+            json.dump({"key": key, "identity": identity,
+                       "format": cache_format}, fd)
@@ -0,0 +1,208 @@
+import re
+
+from .base import DataReaderError
+
+__all__ = ["EMONFormulaError", "FormulaParser", "parse_formula",
+           "render_formula"]
+
+# (kind, regex), the first matching kind wins
+TOKEN_TYPES = [
+    ("space", r"\s+"),
+    ("number", r"(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"),
+    ("name", r"[A-Za-z_][\w.]*(?:\[\d+\][\w.]*)*"),  # a.b[0].c
+    ("operator", r">=|<=|==|!=|&&|\|\||[-+*/()<>?:,!]"),
+]
+
+_TOKEN = re.compile("|".join("(?P<%s>%s)" % t for t in TOKEN_TYPES))
+
+# binary operators by precedence, from the lowest
+BINARY_OPERATORS = [("||",), ("&&",), ("==", "!="), (">", "<", ">=", "<="),
+                    ("+", "-"), ("*", "/")]
+
+
+class EMONFormulaError(DataReaderError):
+    pass
+
+
+class Token(object):
+    """
+    A lexical token of a formula
+    """
+
+    def __init__(self, kind, text, start):
+        self.kind = kind
+        self.text = text
+        self.start = start
+
+    @property
+    def end(self):
+        return self.start + len(self.text)
+
+    def __repr__(self):
+        return "%s(%r)" % (self.kind, self.text)
+
+
+class FormulaParser(object):
+    """
+    Recursive descent parser of EDP metric formulas.
+
+    The tree is made of tuples:
+        ("number", float)
+        ("name", str)
+        ("unary", op, operand)
+        ("binary", op, left, right)
+        ("ternary", condition, if_true, if_false)
+        ("call", function, arg, ...)
+    """
+
+    def __init__(self, formula):
+        """
+        :param formula: str
+        """
+        self.formula = formula
+        self.tokens = self.tokenize(formula)
+        self._pos = 0
+
+    @staticmethod
+    def tokenize(formula):
+        """
+        :param formula: str
+        :return: list [Token] white spaces dropped
+        """
+        tokens = []
+        pos = 0
+        while pos < len(formula):
+            match = _TOKEN.match(formula, pos)
+            if match is None:
+                raise EMONFormulaError("unexpected '%s' at %s of '%s'"
+                                       % (formula[pos], pos, formula))
+            if match.lastgroup != "space":
+                tokens.append(Token(match.lastgroup, match.group(), pos))
+            pos = match.end()
+        return tokens
+
+    def parse(self):
+        """
+        :return: tuple formula tree
+        """
+        if len(self.tokens) == 0:
+            raise EMONFormulaError("empty formula")
+
+        tree = self._ternary()
+        if self._peek() is not None:
+            self._error("unexpected '%s'" % self._peek().text)
+        return tree
+
+    def _peek(self):
+        if self._pos < len(self.tokens):
+            return self.tokens[self._pos]
+        return None
+
+    def _accept(self, *texts):
+        token = self._peek()
+        if token is not None and token.kind == "operator" \
+                and token.text in texts:
+            self._pos += 1
+            return token.text
+        return None
+
+    def _expect(self, text):
+        if self._accept(text) is None:
+            self._error("'%s' expected" % text)
+
+    def _error(self, message):
+        token = self._peek()
+        position = len(self.formula) if token is None else token.start
+        raise EMONFormulaError("%s at %s of '%s'"
+                               % (message, position, self.formula))
+
+    def _ternary(self):
+        condition = self._binary(0)
+        if self._accept("?") is None:
+            return condition
+
+        if_true = self._ternary()
+        self._expect(":")
+        return "ternary", condition, if_true, self._ternary()
+
+    def _binary(self, level):
+        if level == len(BINARY_OPERATORS):
+            return self._unary()
+
+        left = self._binary(level + 1)
+        while True:
+            op = self._accept(*BINARY_OPERATORS[level])
+            if op is None:
+                return left
+            left = "binary", op, left, self._binary(level + 1)
+
+    def _unary(self):
+        op = self._accept("-", "+", "!")
+        if op is not None:
+            return "unary", op, self._unary()
+        return self._primary()
+
+    def _primary(self):
+        token = self._peek()
+        if token is None:
+            self._error("operand expected")
+
+        if self._accept("(") is not None:
+            tree = self._ternary()
+            self._expect(")")
+            return tree
+
+        if token.kind == "number":
+            self._pos += 1
+            return "number", float(token.text)
+
+        if token.kind != "name":
+            self._error("unexpected '%s'" % token.text)
+
+        self._pos += 1
+        if self._accept("(") is None:
+            return "name", token.text
+
+        args = []
+        if self._accept(")") is None:
+            args.append(self._ternary())
+            while self._accept(",") is not None:
+                args.append(self._ternary())
+            self._expect(")")
+        return ("call", token.text) + tuple(args)
+
+
+def parse_formula(formula):
+    """
+    :param formula: str
+    :return: tuple formula tree, see FormulaParser
+    """
+    return FormulaParser(formula).parse()
+
+
+def render_formula(tree, names=None):
+    """
+    Write a formula tree back as text, fully parenthesized.
+
+    :param tree: tuple formula tree
+    :param names: dict {str: str} replacement of names
+    :return: str
+    """
+    names = {} if names is None else names
+    kind = tree[0]
+
+    if kind == "number":
+        return repr(tree[1])
+    if kind == "name":
+        return names.get(tree[1], tree[1])
+    if kind == "unary":
+        return "%s%s" % (tree[1], render_formula(tree[2], names))
+    if kind == "binary":
+        return "(%s %s %s)" % (render_formula(tree[2], names), tree[1],
+                               render_formula(tree[3], names))
+    if kind == "ternary":
+        return "(%s ? %s : %s)" % tuple(render_formula(t, names)
+                                        for t in tree[1:])
+
+    return "%s(%s)" % (tree[1], ", ".join(render_formula(t, names)
+                                          for t in tree[2:]))
@@ -0,0 +1,663 @@
+import numpy as np
+import pandas as pd
+
+from .Emon import (EMONDataError, EMONMetricFormulaReader, EMONReader,
+                   group_reduce)
+from .emon_formula import EMONFormulaError
+
+__all__ = ["EMONCompiledMetric", "EMONFormulaGraph", "EMONMetricEngine",
+           "group_sum", "group_counters", "view_columns"]
+
+NUMEXPR_SUPPORT = True
+try:
+    import numexpr
+except ImportError:
+    NUMEXPR_SUPPORT = False
+
+# functions allowed in formulas, mapped to numpy
+FUNCTIONS = {"min": np.minimum, "max": np.maximum, "abs": np.abs}
+
+TSC = "TSC"  # pseudo event, the time stamp counter of each sample
+
+# numpy ufunc of each formula operator
+BINARY_OPERATORS = {
+    "+": np.add, "-": np.subtract, "*": np.multiply, "/": np.true_divide,
+    ">": np.greater, ">=": np.greater_equal, "<": np.less,
+    "<=": np.less_equal, "==": np.equal, "!=": np.not_equal,
+    "&&": np.logical_and, "||": np.logical_or,
+}
+UNARY_OPERATORS = {"-": np.negative, "+": np.positive, "!": np.logical_not}
+
+# numexpr spelling of formula operators which differ
+NUMEXPR_OPERATORS = {"&&": "&", "||": "|", "!": "~"}
+
+# graph operators fused into one numexpr expression, as format strings;
+# logical operators are left out, numexpr & | ~ are bitwise on integers
+NUMEXPR_NODES = {BINARY_OPERATORS[op]: "(%%s %s %%s)" % op
+                 for op in ("+", "-", "*", "/", ">", ">=", "<", "<=", "==",
+                            "!=")}
+NUMEXPR_NODES.update({np.negative: "(-%s)", np.abs: "abs(%s)"})
+NUMEXPR_TYPES = [np.dtype(t) for t in (bool, np.int32, np.int64, np.float32,
+                                       np.float64)]
+
+# operators whose operands can be sorted without changing the result
+COMMUTATIVE = (np.add, np.multiply, np.minimum, np.maximum,
+               np.logical_and, np.logical_or)
+
+
+def group_sum(values, groups):
+    """
+    Sum columns sharing the same group id with one reduceat call
+
+    :param values: ndarray [samples, columns]
+    :param groups: ndarray [columns] group id of each column
+    :return: (ndarray [groups] ids, ndarray [samples, groups] sums)
+    """
+    return group_reduce(values, groups, np.add)
+
+
+def view_columns(view, cpus, topology=None):
+    """
+    Map cpu columns of core events to the columns of a view
+
+    :param view: str EMONReader.SYSTEM | SOCKET | CORE | THREAD
+    :param cpus: int number of cpu columns of core events
+    :param topology: ndarray [cpus, 3] (socket, core, thread) of each cpu
+    :return: (ndarray [cpus] group id, list [str] labels)
+    """
+    if view == EMONReader.SYSTEM:
+        return np.zeros(cpus, dtype=np.int64), ["aggregated"]
+
+    if topology is None:
+        if view == EMONReader.THREAD:
+            return np.arange(cpus), ["cpu %s" % i for i in range(cpus)]
+        raise EMONDataError("topology is required for %s view" % view)
+
+    topology = np.asarray(topology).reshape(-1, 3)
+    if len(topology) != cpus:
+        raise EMONDataError("topology has %s cpus, counters have %s"
+                            % (len(topology), cpus))
+
+    if view == EMONReader.SOCKET:
+        keys = topology[:, :1]
+        label = "socket %s"
+    elif view == EMONReader.CORE:
+        keys = topology[:, :2]
+        label = "socket %s core %s"
+    else:
+        keys = topology
+        label = "socket %s core %s thread %s"
+
+    unique, groups = np.unique(keys, axis=0, return_inverse=True)
+    return groups.reshape(-1), [label % tuple(k) for k in unique]
+
+
+def group_counters(counters, view, cpus, topology=None):
+    """
+    Sum counters per view column, events with one value per cpu are core
+    events, the others are uncore events ordered socket by socket.
+
+    :param counters: dict {event: ndarray [samples, units]}
+    :param view: str
+    :param cpus: int number of cpu columns of core events
+    :param topology: ndarray [cpus, 3] (socket, core, thread) of each cpu
+    :return: (dict {event: ndarray [samples, columns]}, list [str])
+    """
+    groups, labels = view_columns(view, cpus, topology)
+    sockets = 1
+    if topology is not None:
+        sockets = len(np.unique(np.asarray(topology).reshape(-1, 3)[:, 0]))
+
+    grouped = {}
+    for event, values in counters.items():
+        samples, units = values.shape
+        if units == cpus:  # core event
+            grouped[event] = group_sum(values, groups)[1]
+        elif view == EMONReader.SYSTEM:
+            grouped[event] = values.sum(axis=1, keepdims=True)
+        elif view == EMONReader.SOCKET and units % sockets == 0:
+            grouped[event] = values.reshape(
+                samples, sockets, units // sockets).sum(axis=2)
+        else:  # uncore events have no core / thread level value
+            grouped[event] = np.full((samples, len(labels)), np.nan)
+
+    return grouped, labels
+
+
+class EMONCompiledMetric(object):
+    """
+    A metric formula compiled to a vectorized expression, aliases are bound
+    to arrays by name when evaluated. Names in the formula which are not
+    aliases are taken as constants, e.g. system.tsc_freq.
+    """
+
+    def __init__(self, formula):
+        """
+        :param formula: EMONMetricFormula
+        """
+        self.name = formula.name
+        self.formula = formula.formula
+        self.tree = formula.tree
+
+        self.events, self.constants = {}, {}
+        for alias, (tag, text) in formula.get_aliases().items():
+            if tag == "event":
+                self.events[alias] = text
+            else:
+                self.constants[alias] = text
+
+        self.variables = {}  # {alias: python safe name}
+        self.has_calls = False  # min / max are not numexpr functions
+        self.expression = self.translate(self.tree)
+
+    def translate(self, tree):
+        """
+        Write a formula tree as a numexpr expression
+
+        :param tree: tuple formula tree
+        :return: str
+        """
+        kind = tree[0]
+        if kind == "number":
+            return repr(tree[1])
+
+        if kind == "name":
+            alias = tree[1]
+            if alias not in self.events and alias not in self.constants:
+                self.constants[alias] = alias
+            return self.variables.setdefault(
+                alias, "v%s" % len(self.variables))
+
+        if kind == "unary":
+            if tree[1] not in UNARY_OPERATORS:
+                raise EMONDataError("unsupported operator '%s' in %s"
+                                    % (tree[1], self.name))
+            return "(%s%s)" % (NUMEXPR_OPERATORS.get(tree[1], tree[1]),
+                               self.translate(tree[2]))
+
+        if kind == "binary":
+            if tree[1] not in BINARY_OPERATORS:
+                raise EMONDataError("unsupported operator '%s' in %s"
+                                    % (tree[1], self.name))
+            return "(%s %s %s)" % (self.translate(tree[2]),
+                                   NUMEXPR_OPERATORS.get(tree[1], tree[1]),
+                                   self.translate(tree[3]))
+
+        if kind == "ternary":
+            return "where(%s, %s, %s)" % tuple(
+                self.translate(t) for t in tree[1:])
+
+        if tree[1] not in FUNCTIONS or len(tree) < 3:
+            raise EMONDataError("unsupported function '%s' in %s"
+                                % (tree[1], self.name))
+        self.has_calls = True
+        return "%s(%s)" % (tree[1], ", ".join(self.translate(t)
+                                              for t in tree[2:]))
+
+    def _evaluate_tree(self, tree, namespace):
+        kind = tree[0]
+        if kind == "number":
+            return tree[1]
+        if kind == "name":
+            return namespace[tree[1]]
+
+        args = [self._evaluate_tree(t, namespace) for t in tree[2:]]
+        if kind == "unary":
+            return UNARY_OPERATORS[tree[1]](*args)
+        if kind == "binary":
+            return BINARY_OPERATORS[tree[1]](*args)
+        if kind == "ternary":
+            args = [self._evaluate_tree(t, namespace) for t in tree[1:]]
+            return np.where(*args)
+
+        function = FUNCTIONS[tree[1]]
+        if function is np.abs:
+            return function(args[0])
+
+        result = args[0]
+        for arg in args[1:]:
+            result = function(result, arg)
+        return result
+
+    def evaluate(self, namespace):
+        """
+        :param namespace: dict {alias: ndarray | float}
+        :return: ndarray
+        """
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            if NUMEXPR_SUPPORT and not self.has_calls:
+                local = {self.variables[k]: v for k, v in namespace.items()
+                         if k in self.variables}
+                result = numexpr.evaluate(self.expression, local_dict=local)
+            else:
+                result = self._evaluate_tree(self.tree, namespace)
+
+        result = np.asarray(result, dtype=np.float64)
+        result[np.isinf(result)] = np.nan
+        return result
+
+
+class EMONFormulaGraph(object):
+    """
+    Dependency graph of all metric formulas.
+
+    Every sub expression becomes a node keyed by its operator and operand
+    nodes, so events, constants and intermediate results shared between
+    metrics are built and evaluated once. Operands of commutative operators
+    are sorted, "a*b" and "b*a" are the same node.
+
+    With numexpr installed, arithmetic nodes used by a single other node are
+    fused into the expression of their user and evaluated in one pass.
+    """
+
+    def __init__(self, formulas):
+        """
+        :param formulas: iterable [EMONMetricFormula]
+        """
+        self.nodes = []  # [(op, operand, ...)] operands are node ids
+        self._ids = {}  # {node: id}
+        self.outputs = {}  # {metric name: node id}
+
+        self.metrics = {}
+        self.errors = {}  # {metric name: reason} formulas not compiled
+        for formula in formulas:
+            try:
+                metric = EMONCompiledMetric(formula)
+                self.outputs[metric.name] = self.add_metric(metric)
+            except (EMONDataError, EMONFormulaError) as e:
+                self.errors[formula.name] = str(e)
+                continue
+            self.metrics[metric.name] = metric
+
+    def add_node(self, *node):
+        """
+        :param node: tuple (op, operand, ...)
+        :return: int node id, the existing id for a known node
+        """
+        if node[0] in COMMUTATIVE:
+            node = (node[0],) + tuple(sorted(node[1:]))
+
+        node_id = self._ids.get(node)
+        if node_id is None:
+            node_id = len(self.nodes)
+            self.nodes.append(node)
+            self._ids[node] = node_id
+        return node_id
+
+    def add_metric(self, metric):
+        """
+        :param metric: EMONCompiledMetric
+        :return: int node id of the metric result
+        """
+        return self._add_tree(metric.tree, metric)
+
+    def _add_tree(self, tree, metric):
+        # operators and functions are validated by EMONCompiledMetric
+        kind = tree[0]
+        if kind == "number":
+            return self.add_node("number", tree[1])
+
+        if kind == "name":
+            alias = tree[1]
+            if alias in metric.events:
+                return self.add_node("event", metric.events[alias])
+            return self.add_node("constant", metric.constants[alias])
+
+        if kind == "unary":
+            return self.add_node(UNARY_OPERATORS[tree[1]],
+                                 self._add_tree(tree[2], metric))
+
+        if kind == "binary":
+            return self.add_node(BINARY_OPERATORS[tree[1]],
+                                 self._add_tree(tree[2], metric),
+                                 self._add_tree(tree[3], metric))
+
+        if kind == "ternary":
+            return self.add_node(np.where, *[self._add_tree(t, metric)
+                                             for t in tree[1:]])
+
+        function = FUNCTIONS[tree[1]]
+        if function is np.abs:
+            return self.add_node(function, self._add_tree(tree[2], metric))
+
+        # min / max of any number of arguments
+        node_id = self._add_tree(tree[2], metric)
+        for arg in tree[3:]:
+            node_id = self.add_node(function, node_id,
+                                    self._add_tree(arg, metric))
+        return node_id
+
+    def required_nodes(self, metrics=None):
+        """
+        :param metrics: list [str] metric names, None for all
+        :return: list [int] node ids in evaluation order
+        """
+        if metrics is None:
+            metrics = self.outputs.keys()
+
+        required = set()
+        pending = [self.outputs[m] for m in metrics]
+        while pending:
+            node_id = pending.pop()
+            if node_id in required:
+                continue
+            required.add(node_id)
+            if not isinstance(self.nodes[node_id][0], str):
+                pending.extend(self.nodes[node_id][1:])
+
+        # operands are always added before the node using them
+        return sorted(required)
+
+    def required_events(self, metrics=None):
+        """
+        :param metrics: list [str] metric names, None for all
+        :return: list [str]
+        """
+        return sorted(self.nodes[i][1] for i in self.required_nodes(metrics)
+                      if self.nodes[i][0] == "event")
+
+    def evaluate(self, counters, get_constant, metrics=None):
+        """
+        Evaluate the nodes required by metrics, intermediate arrays are
+        released as soon as their last user is evaluated.
+
+        :param counters: dict {event: ndarray}
+        :param get_constant: function (str) -> float, raise EMONDataError
+        :param metrics: list [str] metric names, None for all
+        :return: dict {metric: ndarray}, metrics missing inputs are skipped
+        """
+        if metrics is None:
+            metrics = list(self.outputs.keys())
+
+        order = self.required_nodes(metrics)
+        users = dict.fromkeys(order, 0)
+        for node_id in self.outputs.values():
+            if node_id in users:
+                users[node_id] += 1  # held until the end
+        for node_id in order:
+            if not isinstance(self.nodes[node_id][0], str):
+                for operand in self.nodes[node_id][1:]:
+                    users[operand] += 1
+
+        fused = set()
+        if NUMEXPR_SUPPORT:
+            outputs = {self.outputs[m] for m in metrics}
+            for node_id in order:
+                if self.nodes[node_id][0] not in NUMEXPR_NODES:
+                    continue
+                fused.update(i for i in self.nodes[node_id][1:]
+                             if users[i] == 1 and i not in outputs
+                             and self.nodes[i][0] in NUMEXPR_NODES)
+
+        values = {}
+        with np.errstate(divide="ignore", invalid="ignore",
+                         over="ignore"):
+            for node_id in order:
+                if node_id in fused:
+                    continue  # evaluated as a part of its user
+                op, *operands = self.nodes[node_id]
+
+                if op in NUMEXPR_NODES and any(i in fused for i in operands):
+                    variables, operands = {}, []
+                    expression = self._expression(node_id, fused, variables,
+                                                  operands)
+                    values[node_id] = self._evaluate_fused(
+                        node_id, expression, variables, fused, values)
+                else:
+                    values[node_id] = self._evaluate_node(
+                        op, operands, values, counters, get_constant)
+                    if isinstance(op, str):
+                        continue
+
+                for operand in operands:
+                    users[operand] -= 1
+                    if users[operand] == 0:
+                        del values[operand]
+
+        result = {}
+        for metric in metrics:
+            value = values.get(self.outputs[metric])
+            if value is None:
+                continue  # event not collected or constant not given
+            value = np.asarray(value, dtype=np.float64)
+            value[np.isinf(value)] = np.nan
+            result[metric] = value
+        return result
+
+    def _expression(self, node_id, fused, variables, operands):
+        """
+        Write a node and the fused nodes below it as a numexpr expression
+
+        :param node_id: int
+        :param fused: set {int} node ids evaluated inside their user
+        :param variables: dict {int: str} updated, names of operand nodes
+        :param operands: list [int] updated, operand nodes of the expression
+        :return: str
+        """
+        op, *args = self.nodes[node_id]
+        texts = []
+        for arg in args:
+            if arg in fused:
+                texts.append(self._expression(arg, fused, variables,
+                                              operands))
+            else:
+                operands.append(arg)
+                texts.append(variables.setdefault(arg, "v%s" % arg))
+        return NUMEXPR_NODES[op] % tuple(texts)
+
+    def _evaluate_fused(self, node_id, expression, variables, fused, values):
+        local = {name: values[i] for i, name in variables.items()}
+        if any(value is None for value in local.values()):
+            return None
+
+        # other types (e.g. uint64) are cast by numexpr, numpy keeps them
+        if all(np.result_type(value) in NUMEXPR_TYPES
+               for value in local.values()):
+            try:
+                return numexpr.evaluate(expression, local_dict=local)
+            except (TypeError, ValueError, NotImplementedError):
+                pass  # operand types numexpr has no kernel for
+
+        def evaluate(i):
+            if i not in fused and i != node_id:
+                return values[i]
+            op, *args = self.nodes[i]
+            return op(*[evaluate(arg) for arg in args])
+
+        return evaluate(node_id)
+
+    @staticmethod
+    def _evaluate_node(op, operands, values, counters, get_constant):
+        if op == "number":
+            return operands[0]
+        if op == "event":
+            return counters.get(operands[0])
+        if op == "constant":
+            try:
+                return get_constant(operands[0])
+            except EMONDataError:
+                return None
+
+        args = [values[i] for i in operands]
+        if any(arg is None for arg in args):
+            return None
+        return op(*args)
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+class EMONMetricEngine(object):
+    """
+    Compute EDP metrics directly from EMON raw counters.
+
+    Events are summed per view column first (system, socket, core, thread)
+    and formulas are evaluated on the sums, as EDP does.
+    """
+
+    def __init__(self, formulas, constants=None, topology=None):
+        """
+        :param formulas: str metric xml file | iterable [EMONMetricFormula]
+        :param constants: dict {str: float} e.g. {"system.tsc_freq": 2.1e9}
+        :param topology: list [(socket, core, thread)] of each cpu column
+        """
+        if isinstance(formulas, str):
+            formulas = EMONMetricFormulaReader(formulas)
+
+        if not isinstance(formulas, EMONFormulaGraph):
+            formulas = EMONFormulaGraph(formulas)
+
+        self.graph = formulas
+        self.metrics = self.graph.metrics
+        self.errors = self.graph.errors
+
+        self.topology = None
+        if topology is not None:
+            self.topology = np.array(topology, dtype=np.int64).reshape(-1, 3)
+
+        self.constants = self.derive_constants()
+        if constants is not None:
+            self.constants.update(constants)
+
+    def derive_constants(self):
+        """
+        System constants known from topology
+
+        :return: dict
+        """
+        if self.topology is None:
+            return {}
+
+        sockets = np.unique(self.topology[:, 0])
+        first = self.topology[self.topology[:, 0] == sockets[0]]
+        core = first[first[:, 1] == first[0, 1]]
+        return {"system.socket_count": len(sockets),
+                "system.sockets[0].cpus.count": len(first),
+                "system.sockets[0].cores.count": len(np.unique(first[:, 1])),
+                "system.sockets[0][0].size": len(core)}
+
+    def select(self, metrics=None):
+        """
+        :param metrics: list [str] metric names, None for all
+        :return: list [EMONCompiledMetric]
+        """
+        if metrics is None:
+            return list(self.metrics.values())
+
+        missing = [m for m in metrics if m not in self.metrics]
+        if missing:
+            raise EMONDataError("Unknown metrics: %s" % ", ".join(missing))
+        return [self.metrics[m] for m in metrics]
+
+    def required_events(self, metrics=None):
+        """
+        :param metrics: list [str] metric names, None for all
+        :return: list [str] raw events needed
+        """
+        names = [metric.name for metric in self.select(metrics)]
+        return [event for event in self.graph.required_events(names)
+                if event != TSC]
+
+    def get_constant(self, text):
+        try:
+            return float(text)
+        except ValueError:
+            pass
+
+        if text not in self.constants:
+            raise EMONDataError("constant %s is not given" % text)
+        return float(self.constants[text])
+
+    def evaluate(self, counters, metrics=None):
+        """
+        Evaluate metrics on counter arrays of the same shape
+
+        :param counters: dict {event: ndarray}, may contain TSC
+        :param metrics: list [str] metric names, None for all
+        :return: dict {metric: ndarray}
+        """
+        names = [metric.name for metric in self.select(metrics)]
+        return self.graph.evaluate(counters, self.get_constant, names)
+
+    def view_columns(self, view, cpus):
+        """
+        :param view: str EMONReader.SYSTEM | SOCKET | CORE | THREAD
+        :param cpus: int number of cpu columns of core events
+        :return: (ndarray [cpus] group id, list [str] labels)
+        """
+        return view_columns(view, cpus, self.topology)
+
+    def group_counters(self, counters, view, cpus):
+        """
+        Sum counters per view column
+
+        :param counters: dict {event: ndarray [samples, units]}
+        :param view: str
+        :param cpus: int number of cpu columns of core events
+        :return: (dict {event: ndarray [samples, columns]}, list [str])
+        """
+        return group_counters(counters, view, cpus, self.topology)
+
+    def _load(self, raw_file, metrics):
+        counters = raw_file.get_counters(self.required_events(metrics))
+        counters = {k: v for k, v in counters.items() if len(v[0]) > 0}
+        if len(counters) == 0:
+            raise EMONDataError("No required event in %s" % raw_file.filename)
+
+        cpus = self.cpu_count(counters)
+        return counters, cpus
+
+    def cpu_count(self, counters):
+        if self.topology is not None:
+            return len(self.topology)
+        # core events have the most columns
+        return max(values.shape[1] for _, values in counters.values())
+
+    def summary(self, raw_file, view=EMONReader.SYSTEM, metrics=None):
+        """
+        Metrics of the whole run, events are scaled by their multiplexed
+        sampling time before formulas are applied.
+
+        :param raw_file: EMONRawFile
+        :param view: str
+        :param metrics: list [str] metric names, None for all
+        :return: data frame, metrics as index, view columns as columns
+        """
+        counters, cpus = self._load(raw_file, metrics)
+
+        total_time = max(ts.sum() for ts, _ in counters.values())
+        totals = {}
+        for event, (ts, values) in counters.items():
+            scale = total_time / ts.sum() if ts.sum() > 0 else np.nan
+            totals[event] = values.sum(axis=0, keepdims=True) * scale
+        totals[TSC] = np.full((1, cpus), total_time, dtype=np.float64)
+
+        grouped, labels = self.group_counters(totals, view, cpus)
+        result = self.evaluate(grouped, metrics)
+        return pd.DataFrame({k: v[0] for k, v in result.items()},
+                            index=labels).T
+
+    def details(self, raw_file, view=EMONReader.SYSTEM, metrics=None):
+        """
+        Metrics per sample, the n-th samples of all events are aligned.
+
+        :param raw_file: EMONRawFile
+        :param view: str
+        :param metrics: list [str] metric names, None for all
+        :return: data frame, samples as index, (metric, column) as columns
+        """
+        counters, cpus = self._load(raw_file, metrics)
+
+        samples = min(len(ts) for ts, _ in counters.values())
+        ts = next(iter(counters.values()))[0][:samples]
+        aligned = {k: v[:samples] for k, (_, v) in counters.items()}
+        aligned[TSC] = np.repeat(ts.reshape(-1, 1), cpus, axis=1)
+
+        grouped, labels = self.group_counters(aligned, view, cpus)
+        result = self.evaluate(grouped, metrics)
+
+        columns = pd.MultiIndex.from_product([list(result.keys()), labels])
+        if len(result) == 0:
+            return pd.DataFrame(index=range(samples), columns=columns)
+        return pd.DataFrame(np.hstack(list(result.values())),
+                            columns=columns)
@@ -13,7 +13,20 @@ class FIOReader(RawDataFileReader):
         self.filename = filename
 
     def get_bandwidth(self, grep_filter):
-        context = self.grep(grep_filter.upper())
+        return self.get_bandwidth_list([grep_filter])[grep_filter]
+
+    def get_bandwidth_list(self, grep_filters):
+        """
+        Get bandwidth of many directions with one scan of the file
+
+        :param grep_filters: list [str] e.g. ["READ", "WRITE"]
+        :return: dict {str: float}
+        """
+        rows = self.batch_grep({f: f.upper() for f in grep_filters},
+                               regex=False)
+        return {k: self._bandwidth(v) for k, v in rows.items()}
+
+    def _bandwidth(self, context):
         value = 0
         for row in context:
             match = re.search(self.bandwidth_reg, row)
@@ -35,3 +48,7 @@ class FIOReader(RawDataFileReader):
     @property
     def write_bandwidth(self):
         return self.get_bandwidth("WRITE")
+
+    @property
+    def bandwidth(self):
+        return self.get_bandwidth_list(["READ", "WRITE"])
@@ -1,10 +1,15 @@
 import os
 import re
 from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import pandas as pd
 
 from .base import DataReaderError, DataCacheObject
+from .compression import open_file
+
+# default of optional arguments where None is a meaningful value
+_NOT_GIVEN = object()
 
 
 class CSVCombineHelper(DataCacheObject):
@@ -99,6 +104,25 @@ class CSVCombineHelper(DataCacheObject):
     def get_content(self):
         return self.get_dataframe()
 
+    def cache_params(self):
+        # data_prepare of child objects reads per instance settings
+        builder = None
+        if self.builder is not None:
+            builder = "%s.%s" % (getattr(self.builder, "__module__", ""),
+                                 getattr(self.builder, "__qualname__",
+                                         repr(self.builder)))
+        settings = {k: repr(v) for k, v in sorted(vars(self).items())
+                    if not k.startswith("_")
+                    and k not in ("builder", "disk_cache_path")}
+        return {"builder": builder, "settings": settings}
+
+    def source_files(self):
+        files = [self.root_path]
+        for path in self.path_walk():
+            for root, _, filenames in os.walk(path):
+                files.extend(os.path.join(root, f) for f in sorted(filenames))
+        return files
+
     def get_column_name(self, full_path):
         """
         covert column name by path
@@ -127,7 +151,7 @@ class CPUCoreList(object):
         :param cpu_set: string
         :param sep: string
         """
-        if isinstance(cpu_set, Iterable):
+        if isinstance(cpu_set, Iterable) and not isinstance(cpu_set, str):
             cpu_set = sep.join([str(core) for core in cpu_set])
 
         cpu_set = cpu_set.replace(" ", "")
@@ -266,20 +290,43 @@ class ExcelSheet:
         self.writer = None
 
 
+def _read_tagged_file(reader, tag):
+    """
+    Worker entry for MultiFilesReader, module level to be picklable
+
+    :param reader: MultiFilesReader
+    :param tag: str
+    :return: (str, list)
+    """
+    return tag, reader.read_file(tag)
+
+
 class MultiFilesReader:
     """
     Read multiple files with same format
     """
 
-    filenames = {}  # all files {tag: filename}
-    content = {}  # data cached
+    # parallel backend for get_data: "thread" | "process" | None (serial)
+    backend = "thread"
+    workers = None  # pool size, None for the default of concurrent.futures
 
-    def __init__(self, files=None):
+    def __init__(self, files=None, backend=_NOT_GIVEN, workers=None):
         """
         Object constructor
 
         :param files: string | [str] | {str: str} filename or name list
+        :param backend: str "thread" | "process" | None for serial, the
+            class default when not given
+        :param workers: int pool size
         """
+        self.filenames = {}  # all files {tag: filename}
+        self.content = {}  # data cached
+
+        if backend is not _NOT_GIVEN:
+            self.backend = backend
+        if workers is not None:
+            self.workers = workers
+
         if files is not None:
             if isinstance(files, str):
                 self.add_file(files)
@@ -316,20 +363,50 @@ class MultiFilesReader:
         """
         return row[:-1]
 
+    def iter_rows(self, tag):
+        """
+        Stream the filtered rows of one file, nothing is cached
+
+        :param tag: str the tag
+        :return: iterator
+        """
+        with open_file(self.filenames[tag]) as fd:
+            for row in fd:
+                yield self.filter(row)
+
+    def read_file(self, tag):
+        """
+        :param tag: str the tag
+        :return: list
+        """
+        return list(self.iter_rows(tag))
+
     def get_data(self):
         """
-        Begin to read files
+        Begin to read files, in parallel when backend is set
 
         :return: dict
         """
-        data = {}
-        for k, v in self.filenames.items():
-            with open(v) as fd:
-                data[k] = [self.filter(row) for row in fd.readlines()]
+        tags = list(self.filenames.keys())
+
+        if self.backend is None or len(tags) < 2:
+            data = {tag: self.read_file(tag) for tag in tags}
+        else:
+            if self.backend == "process":
+                executor = ProcessPoolExecutor(self.workers)
+            elif self.backend == "thread":
+                executor = ThreadPoolExecutor(self.workers)
+            else:
+                raise DataReaderError("Unknown backend %s" % self.backend)
+
+            with executor:
+                result = executor.map(_read_tagged_file, [self] * len(tags),
+                                      tags)
+                data = dict(result)
 
         self.content = data
         return data
 
     @property
     def data(self):
-        return self.content
\ No newline at end of file
+        return self.content
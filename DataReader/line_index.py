@@ -0,0 +1,163 @@
+import mmap
+import os
+import re
+
+import numpy as np
+
+__all__ = ["LineOffsetIndex"]
+
+
+class LineOffsetIndex(object):
+    """
+    Read-only list-like view over a memory-mapped text file.
+
+    The file is never loaded as a whole; only the start offset of every line
+    is kept in a numpy array, so the memory cost is 8 bytes per line.
+    Lines ending with "\r\n" are returned with "\n" as text mode reads them.
+    """
+
+    encoding = "utf-8"
+    chunk_size = 64 * 2 ** 20  # bytes scanned per step while indexing
+
+    def __init__(self, filename, encoding=None):
+        """
+        :param filename: str
+        :param encoding: str text encoding of the file
+        """
+        self.filename = filename
+        if encoding is not None:
+            self.encoding = encoding
+
+        self._fd = open(filename, "rb")
+        self.size = os.fstat(self._fd.fileno()).st_size
+
+        if self.size == 0:
+            self._map = b""
+        else:
+            self._map = mmap.mmap(self._fd.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+
+        self.offsets = self._build_offsets()
+        self.crlf = self._map.find(b"\r\n") != -1
+
+    def _build_offsets(self):
+        """
+        Scan the mapped bytes for new lines, chunk by chunk.
+
+        :return: numpy array [int64] start offset of every line + file size
+        """
+        offsets = [np.zeros(1, dtype=np.int64)]
+        for start in range(0, self.size, self.chunk_size):
+            end = min(start + self.chunk_size, self.size)
+            chunk = np.frombuffer(self._map, dtype=np.uint8,
+                                  count=end - start, offset=start)
+            offsets.append(np.flatnonzero(chunk == 0x0a).astype(np.int64)
+                           + (start + 1))
+
+        offsets = np.concatenate(offsets)
+        if offsets[-1] != self.size:
+            # last line has no trailing new line
+            offsets = np.append(offsets, self.size)
+
+        return offsets
+
+    def line_span(self, line_no):
+        """
+        Byte range of a line
+
+        :param line_no: int 0-based line number
+        :return: (int, int)
+        """
+        return int(self.offsets[line_no]), int(self.offsets[line_no + 1])
+
+    def spans(self, block=2 ** 16):
+        """
+        Byte ranges of all lines, converted from numpy block by block
+
+        :param block: int lines per block
+        :return: iterator [(int, int)]
+        """
+        for first in range(0, len(self), block):
+            offsets = self.offsets[first:first + block + 1].tolist()
+            for span in zip(offsets[:-1], offsets[1:]):
+                yield span
+
+    def decode(self, start, end):
+        """
+        Decode a byte range of the mapped file
+
+        :param start: int
+        :param end: int
+        :return: str
+        """
+        text = self._map[start:end].decode(self.encoding, errors="replace")
+        if self.crlf and text.endswith("\r\n"):
+            text = text[:-2] + "\n"
+        return text
+
+    def find_line(self, offset):
+        """
+        Get the line number which contains the byte offset
+
+        :param offset: int
+        :return: int
+        """
+        return int(np.searchsorted(self.offsets, offset, side="right")) - 1
+
+    def grep(self, key_word):
+        """
+        Yield lines containing key_word, searching the mapped bytes directly.
+
+        :param key_word: str
+        :return: iterator [str]
+        """
+        key_word = key_word.encode(self.encoding)
+        pos = self._map.find(key_word)
+        while pos != -1:
+            start, end = self.line_span(self.find_line(pos))
+            yield self.decode(start, end)
+            pos = self._map.find(key_word, end)
+
+    def egrep(self, regex):
+        """
+        Yield lines matching regex from the start of the line.
+
+        :param regex: str regex string
+        :return: iterator [str]
+        """
+        if self.crlf:
+            # match the lines as decoded, "$" must not see the "\r"
+            regex = re.compile(regex)
+            for line in self:
+                if regex.match(line):
+                    yield line
+            return
+
+        # multi-line mode makes "^" match at every line start offset
+        regex = re.compile(regex.encode(self.encoding), re.M)
+        for start, end in self.spans():
+            if regex.match(self._map, start, end):
+                yield self.decode(start, end)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._fd.close()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(len(self))[item]]
+
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("line index out of range")
+
+        return self.decode(*self.line_span(item))
+
+    def __iter__(self):
+        for start, end in self.spans():
+            yield self.decode(start, end)
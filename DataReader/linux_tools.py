@@ -3,6 +3,7 @@ from abc import ABCMeta
 import pandas as pd
 
 from DataReader.base import LinuxColumnStyleOutputReader
+from DataReader.compression import open_file
 from DataReader.helper import CPUCoreList
 
 __all__ = ["VmstatReader", "SarCPUstateReader", "SarNetworkstateReader",
@@ -14,6 +15,11 @@ class VmstatReader(LinuxColumnStyleOutputReader):
     # need more detail column name
     header = ["r", "b", "swpd", "free", "buff", "cache", "si", "so", "bi",
               "bo", "in", "cs", "us", "sy", "id", "wa", "st"]
+    schema = dict([(k, "int32") for k in ["r", "b"]] +
+                  [(k, "uint64") for k in ["swpd", "free", "buff", "cache",
+                                           "si", "so", "bi", "bo", "in",
+                                           "cs"]] +
+                  [(k, "int32") for k in ["us", "sy", "id", "wa", "st"]])
 
 
 class IOstatReader(LinuxColumnStyleOutputReader):
@@ -21,13 +27,14 @@ class IOstatReader(LinuxColumnStyleOutputReader):
     header = ['Device:', 'rrqm/s', 'wrqm/s', 'r/s', 'w/s', 'rkB/s', 'wkB/s',
               'avgrq-sz', 'avgqu-sz', 'await', 'r_await', 'w_await', 'svctm',
               '%util']
+    schema = {k: "float32" for k in header[1:]}
+    schema["Device:"] = "category"
 
     def get_device(self, dev):
         return self.row_filter("Device:", dev)
 
     def aggregate(self, summary="mean"):
-        data = getattr(self.data.groupby("Device:"), summary)
-        return data()
+        return self.group_aggregate("Device:", summary)
 
 
 class BaseSarReader(LinuxColumnStyleOutputReader):
@@ -42,8 +49,8 @@ class BaseSarReader(LinuxColumnStyleOutputReader):
     def data_category(self):
         return self.header[2]
 
-    def get_content(self):
-        df = super().get_content()
+    def parse_rows(self, rows):
+        df = super().parse_rows(rows)
         df["Time"] = df["Time"] + " " + df["AMPM"]
         del (df["AMPM"])
 
@@ -51,8 +58,7 @@ class BaseSarReader(LinuxColumnStyleOutputReader):
         return df
 
     def aggregate(self, summary="mean"):
-        method = getattr(self.data.groupby(self.data_category), summary)
-        return method()
+        return self.group_aggregate(self.data_category, summary)
 
     def __getitem__(self, item):
         return self.data[self.data[self.data_category] == item]
@@ -75,6 +81,8 @@ class SarCPUstateReader(BaseSarReader):
     """
     header = ["Time", "AMPM", "CPU#", "user", "nice", "sys", "io", "steal",
               "idle"]
+    schema = {k: "float32" for k in header[3:]}
+    schema.update({"Time": str, "AMPM": str, "CPU#": "category"})
     data_row_regex = r"^(\d{2}:)\d{2}.*(A|P)M.*(\d+|ALL)"
 
 
@@ -84,6 +92,8 @@ class SarNetworkstateReader(BaseSarReader):
     """
     header = ["Time", "AMPM", 'IFACE', 'rxpck/s', 'txpck/s', 'rxkB/s',
               'txkB/s', 'rxcmp/s', 'txcmp/s', 'rxmcst/s']
+    schema = {k: "float32" for k in header[3:]}
+    schema.update({"Time": str, "AMPM": str, "IFACE": "category"})
 
     data_row_regex = r"^(\d{2}:){2}\d{2}.*(A|P)M\s+[a-z]"
 
@@ -96,7 +106,7 @@ class TurbostatReader(LinuxColumnStyleOutputReader):
         if column_name_list is not None:
             self.header = column_name_list
         else:
-            with open(self.filename) as fd:
+            with open_file(self.filename) as fd:
                 column_name_list = fd.readline()
                 while column_name_list.find("Avg_MHz") == -1:
                     column_name_list = fd.readline()
@@ -111,6 +121,15 @@ class TurbostatReader(LinuxColumnStyleOutputReader):
             row[0], row[1], row[2] = -1, -1, -1
         return row
 
+    def frame_formatter(self, df):
+        # mark global state as "-1"
+        summary = df[df.columns[0]].astype(str) == "-"
+        for col in df.columns[:3]:
+            values = pd.to_numeric(df[col], errors="coerce")
+            values[summary] = -1
+            df[col] = values
+        return df
+
     @property
     def cores(self):
         core_list = map(int, self.data["CPU"].unique())
@@ -4,6 +4,8 @@ import xml.etree.cElementTree as ET
 import pandas as pd
 from matplotlib import pyplot as plt
 
+from .compression import open_file
+
 
 class BasePQoSReader:
     filename = None
@@ -146,7 +148,8 @@ class PQoSCSVReader(BasePQoSReader):
     """
 
     def read_file(self):
-        self.data = pd.read_csv(self.filename)
+        with open_file(self.filename) as fd:
+            self.data = pd.read_csv(fd)
 
 
 class PQoSXMLReader(BasePQoSReader):
@@ -159,7 +162,8 @@ class PQoSXMLReader(BasePQoSReader):
                'mbm_local_MB': "MBL[MB/s]", "mbm_remote_MB": "MBR[MB/s]"}
 
     def read_file(self):
-        file_content = ET.ElementTree(file=self.filename)
+        with open_file(self.filename, "rb") as fd:
+            file_content = ET.ElementTree(file=fd)
         data = []
         for metric in file_content.getroot():
             # metric = {e.tag: float(e.text) for e in metric}
@@ -188,7 +192,7 @@ class PQoSOutputReader(BasePQoSReader):
     reg = re.compile(r"(\d+)(k|m)?", re.I)
 
     def read_file(self):
-        with open(self.filename) as fd:
+        with open_file(self.filename) as fd:
             contents = fd.readlines()
         data = []
         for row_num, row_contents in enumerate(contents):
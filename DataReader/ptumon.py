@@ -5,6 +5,7 @@ import pandas as pd
 from matplotlib.backends.backend_pdf import PdfPages
 
 from DataReader.base import RawDataFileReader
+from DataReader.compression import open_file
 
 
 class PtuReader:
@@ -26,7 +27,7 @@ class PtuReader:
             self.skip_footer = skip_footer
 
         # skip the additional info at the header
-        fd = open(filename, "r")
+        fd = open_file(filename, "r", seekable=True)
         row = ""
         offset = 0
         while not self.header_reg.match(row):
@@ -8,9 +8,19 @@ class BaseCLIOptionReader(RawDataFileReader):
         self.filename = filename
 
     def get_info(self, key):
-        result = self.grep(key).pop(0).split(":")
+        result = list(self.grep(key))[0].split(":")
         return result[1].strip()
 
+    def get_info_list(self, keys):
+        """
+        Get values of many keys with one scan of the file
+
+        :param keys: list [str]
+        :return: list [str]
+        """
+        rows = self.batch_grep({key: key for key in keys}, regex=False)
+        return [rows[key][0].split(":")[1].strip() for key in keys]
+
 
 class CLIOptionReader(BaseCLIOptionReader):
     def __getattr__(self, item):
@@ -43,7 +53,8 @@ class CommandlscpuInfo(BaseCLIOptionReader):
     @property
     def numa(self):
         nodes = int(self.get_info("NUMA node(s):"))
-        return [self.get_info("NUMA node%s CPU(s):" % i) for i in range(nodes)]
+        return self.get_info_list(
+            ["NUMA node%s CPU(s):" % i for i in range(nodes)])
 
     @property
     def llc(self):
@@ -77,8 +88,8 @@ class CommandlscpuInfo(BaseCLIOptionReader):
     @property
     def family_stepping(self):
         # stepping 4 is skx, 5 is clx
-        return (int(self.get_info("CPU family")),
-                int(self.get_info("Stepping")))
+        family, stepping = self.get_info_list(["CPU family", "Stepping"])
+        return int(family), int(stepping)
 
     def is_support(self, feature):
         return feature.lower() in self.flags
@@ -12,6 +12,7 @@ setup(
     description='python lib for raw test data file reading',
 
     install_requires=[
+        "numpy",
         "pandas",
         "xlwt",
         "matplotlib",